@@ -1,27 +1,156 @@
 $( document ).ready(function() {
 
-    $('#like-form').submit(function(e){
-        e.preventDefault()
+    // clicks wait LIKE_DELAY ms for more clicks, then all cards' likes go out in one request
+    const LIKE_DELAY = 400
+    // post id -> liked state the server last confirmed, for posts clicked since the last batch
+    const likesConfirmed = {}
+    let likesTimer = null
+    let likesSending = false
+
+    function likeForms(post_id) {
+        // a post can be on the page more than once
+        return $(`.like-form[data-post-id=${post_id}]`)
+    }
 
-        const post_id = $(this).attr('elementID')
-        const url = $(this).attr('action')
+    function likeCount(post_id) {
+        return parseInt(likeForms(post_id).first().find('.likes-count').text())
+    }
 
+    function showLike(post_id, liked, like_count) {
+        const forms = likeForms(post_id)
+        forms.data('liked', liked)
+        forms.find('button').toggleClass('btn-danger', !liked).toggleClass('btn-outline-danger', liked)
+            .text(liked ? 'Liked 👍' : 'Like 👍')
+        forms.find('.likes-count').text(like_count)
+    }
+
+    function sendLikes() {
+        likesTimer = null
+        if (likesSending) {
+            // one batch at a time, clicks made meanwhile go out in the next one
+            likesTimer = setTimeout(sendLikes, LIKE_DELAY)
+            return
+        }
+        // only the final state of every post is sent, clicks that ended where they started are dropped
+        const likes = {}
+        const before = {}
+        let url = null
+        for (const post_id of Object.keys(likesConfirmed)) {
+            const form = likeForms(post_id)
+            if (form.data('liked') !== likesConfirmed[post_id]) {
+                likes[post_id] = form.data('liked')
+                before[post_id] = likesConfirmed[post_id]
+                url = form.data('batch-url')
+            }
+            delete likesConfirmed[post_id]
+        }
+        if (url === null) {
+            return
+        }
+
+        likesSending = true
         $.ajax({
             type: 'POST',
             url: url,
-            data: {
-                'csrfmiddlewaretoken': $('input[name=csrfmiddlewaretoken]').val(),
-                'post_id':post_id,
-            },
+            data: JSON.stringify({'likes': likes}),
+            contentType: 'application/json',
+            headers: {'X-CSRFToken': $('input[name=csrfmiddlewaretoken]').val()},
             dataType: 'json',
             success: function(response) {
-                $(`#likes_count${post_id}`).text(response['amount_likes'])
+                for (const [post_id, post] of Object.entries(response['posts'])) {
+                    let liked = post['liked']
+                    if (post_id in likesConfirmed) {
+                        // clicked again while the batch was on its way, keep what the user sees
+                        likesConfirmed[post_id] = post['liked']
+                        liked = likeForms(post_id).data('liked')
+                    }
+                    showLike(post_id, liked, post['like_count'] + (liked === post['liked'] ? 0 : (liked ? 1 : -1)))
+                }
             },
 
             error: function(response) {
+                for (const post_id of Object.keys(before)) {
+                    if (!(post_id in likesConfirmed)) {
+                        const like_count = likeCount(post_id)
+                        showLike(post_id, before[post_id], like_count + (before[post_id] ? 1 : -1))
+                    }
+                }
                 alert('An error has occurred while liking a post!')
+            },
+
+            complete: function() {
+                likesSending = false
             }
         })
+    }
+
+    // delegated, so cards appended by "load more" are handled too
+    $(document).on('submit', '.like-form', function(e){
+        e.preventDefault()
+
+        const form = $(this)
+        const post_id = form.data('post-id')
+        const liked = form.data('liked')
+        if (!(post_id in likesConfirmed)) {
+            likesConfirmed[post_id] = liked
+        }
+        // shown right away, the server's count replaces it when the batch is answered
+        const like_count = likeCount(post_id) + (liked ? -1 : 1)
+        showLike(post_id, !liked, like_count)
+
+        clearTimeout(likesTimer)
+        likesTimer = setTimeout(sendLikes, LIKE_DELAY)
+    })
+
+    // like counts of the cards on screen, pushed by the server
+    let likesStream = null
 
+    function watchLikes() {
+        const feed = $('#feed')
+        if (!window.EventSource || !feed.length) {
+            return
+        }
+        if (likesStream) {
+            likesStream.close()
+        }
+        const post_ids = $.map(feed.find('.like-form'), form => $(form).data('post-id'))
+        if (!post_ids.length) {
+            return
+        }
+        likesStream = new EventSource(`${feed.data('live-url')}?posts=${post_ids.join(',')}`)
+        likesStream.addEventListener('likes', function(e) {
+            for (const [post_id, like_count] of Object.entries(JSON.parse(e.data))) {
+                // the user's own clicks on their way to the server win
+                if (!(post_id in likesConfirmed) && !likesSending) {
+                    likeForms(post_id).find('.likes-count').text(like_count)
+                }
+            }
+        })
+    }
+
+    watchLikes()
+
+    $('#load-more').click(function(){
+        const button = $(this)
+
+        $.ajax({
+            type: 'GET',
+            url: button.data('url'),
+            data: {'cursor': button.data('cursor')},
+            dataType: 'json',
+            success: function(response) {
+                $('#feed').append(response['html'])
+                watchLikes()
+                if (response['next_cursor']) {
+                    button.data('cursor', response['next_cursor'])
+                } else {
+                    button.remove()
+                }
+            },
+
+            error: function(response) {
+                alert('An error has occurred while loading posts!')
+            }
+        })
     })
 });
@@ -1,4 +1,4 @@
 from django.contrib import admin
-from .models import Post, Image, ProfilePage, Followers
+from .models import Post, Image, ProfilePage, Followers, OutgoingEmail
 
-admin.site.register([Post, Image, ProfilePage, Followers,])
\ No newline at end of file
+admin.site.register([Post, Image, ProfilePage, Followers, OutgoingEmail,])
\ No newline at end of file
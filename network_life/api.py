@@ -0,0 +1,147 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.http import http_date
+from django.views.decorators.http import require_POST
+
+from .likes import set_likes
+from .models import Post
+from .pagination import paginate_posts, get_page_size
+
+POST_FIELDS = ('id', 'author', 'description', 'preview', 'like_count', 'tags', 'date_published')
+DEFAULT_LIKES_BATCH_SIZE = 100
+
+
+def api_login_required(view):
+    # a 401 instead of the login page redirect of login_required
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def get_fields(request):
+    """Fields asked for with ?fields=id,like_count, all of POST_FIELDS by default. None if one is unknown."""
+    if not request.GET.get('fields'):
+        return POST_FIELDS
+    requested = set(request.GET['fields'].split(','))
+    if not requested <= set(POST_FIELDS):
+        return None
+    return tuple(field for field in POST_FIELDS if field in requested)
+
+
+def serialize_post(post, fields):
+    values = {
+        'id': lambda: post.id,
+        'author': lambda: post.name,
+        'description': lambda: post.description,
+        'preview': lambda: post.preview.url,
+        'like_count': lambda: post.like_count,
+        'tags': lambda: [tag.name for tag in post.tags.all()],
+        'date_published': lambda: post.date_published.isoformat(),
+    }
+    return {field: values[field]() for field in fields}
+
+
+def conditional_json(request, posts, build):
+    """
+    JsonResponse of build(), or a 304 when the client's copy is current.
+
+    The strong ETag covers the query string (cursor, fields, page size) and
+    the (id, version) of every post on the page, version changes with every
+    like, tag change and edit. Both are known before anything is serialized,
+    so a 304 costs only the page query.
+    """
+    state = repr((sorted(request.GET.items()), [(post.id, post.version) for post in posts]))
+    etag = quote_etag(hashlib.sha1(state.encode()).hexdigest())
+    changed = [post.updated_at or post.date_published for post in posts]
+    last_modified = int(max(changed).timestamp()) if changed else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(build())
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    # may be stored, but has to be revalidated every time
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def post_page(request, queryset):
+    fields = get_fields(request)
+    if fields is None:
+        return JsonResponse({'error': f'Unknown field, choose from {", ".join(POST_FIELDS)}'}, status=400)
+    posts, next_cursor = paginate_posts(queryset, request.GET.get('cursor'), get_page_size(request))
+
+    def build():
+        if 'tags' in fields:
+            prefetch_related_objects(posts, 'tags')
+        return {'posts': [serialize_post(post, fields) for post in posts], 'next_cursor': next_cursor}
+
+    return conditional_json(request, posts, build)
+
+
+@api_login_required
+def feed(request):
+    return post_page(request, Post.objects.all())
+
+
+@api_login_required
+def profile_posts(request, username):
+    return post_page(request, Post.objects.filter(name=username))
+
+
+@api_login_required
+def post(request, id):
+    fields = get_fields(request)
+    if fields is None:
+        return JsonResponse({'error': f'Unknown field, choose from {", ".join(POST_FIELDS)}'}, status=400)
+    post = get_object_or_404(Post, id=id)
+
+    def build():
+        data = serialize_post(post, fields)
+        data['images'] = [image.images.url for image in post.images.all()]
+        return {'post': data}
+
+    return conditional_json(request, [post], build)
+
+
+def parse_like_intents(body):
+    """{post_id: liked} from a {"likes": {"<post id>": true|false}} body, None if malformed."""
+    try:
+        intents = {int(post_id): liked for post_id, liked in json.loads(body)['likes'].items()}
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+    if not all(isinstance(liked, bool) for liked in intents.values()):
+        return None
+    return intents
+
+
+@api_login_required
+@require_POST
+def likes(request):
+    """
+    Like and unlike many posts at once. Every intent sets the final state,
+    so a retried or repeated batch is harmless. Answers with the state and
+    like count of every post that exists.
+    """
+    intents = parse_like_intents(request.body)
+    if intents is None:
+        return JsonResponse({'error': 'Expected {"likes": {"<post id>": true|false}}'}, status=400)
+    max_size = getattr(settings, 'LIKES_BATCH_SIZE', DEFAULT_LIKES_BATCH_SIZE)
+    if len(intents) > max_size:
+        return JsonResponse({'error': f'At most {max_size} posts per batch'}, status=400)
+
+    results = set_likes(intents, request.user)
+    return JsonResponse({'posts': {
+        str(post_id): {'liked': liked, 'like_count': like_count} for post_id, (liked, like_count) in results.items()
+    }})
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class NetworkLifeConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'network_life'
+
+    def ready(self):
+        # connects the fragment cache invalidation receivers
+        from . import signals
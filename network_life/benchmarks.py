@@ -0,0 +1,110 @@
+import statistics
+import time
+import tracemalloc
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from .models import ProfilePage, Post
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def view_requests(username, post_id):
+    """(name, method, url, make_data, extra) for every benchmarked view."""
+    def image():
+        f = BytesIO()
+        Image.new(mode='RGB', size=(64, 64)).save(f, 'png')
+        return SimpleUploadedFile('bench.png', f.getvalue())
+
+    xhr = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+    return [
+        ('home', 'get', reverse('network_life:home'), None, {}),
+        ('post', 'get', reverse('network_life:post', kwargs={'id': post_id}), None, {}),
+        ('profile', 'get', reverse('network_life:profile', kwargs={'username': username}), None, {}),
+        ('followers_accounts', 'get', reverse('network_life:followers_accounts', kwargs={'username': username}),
+         None, {}),
+        ('following_accounts', 'get', reverse('network_life:following_accounts', kwargs={'username': username}),
+         None, {}),
+        ('like_unlike_post', 'post', reverse('network_life:like-post-view', kwargs={'post_id': post_id}), None, xhr),
+        ('create_post', 'post', reverse('network_life:create'),
+         lambda: {'main_image': image(), 'description': 'bench', 'tags': 'bench'}, {}),
+    ]
+
+
+def benchmark_targets():
+    """The most followed profile and the most liked post, the heaviest pages of the dataset."""
+    username = ProfilePage.objects.order_by('-followers_count', 'id').values_list('username', flat=True).first()
+    post_id = Post.objects.order_by('-like_count', '-id').values_list('id', flat=True).first()
+    return username, post_id
+
+
+def run_benchmarks(client, username, post_id, requests=20, warmup=2):
+    """
+    Hit every view through the logged in test client and measure it.
+
+    Returns {view: {'p50_ms', 'p95_ms', 'queries', 'peak_kb'}} where queries
+    is the largest per-request SQL count and peak_kb the Python heap peak of
+    one extra, traced request.
+    """
+    report = {}
+    for name, method, url, make_data, extra in view_requests(username, post_id):
+        def request():
+            data = make_data() if make_data else {}
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data, **extra)
+                elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name} answered {response.status_code}')
+            return elapsed * 1000, len(captured)
+
+        for _ in range(warmup):
+            request()
+        timings, queries = zip(*(request() for _ in range(requests)))
+
+        # traced separately, tracemalloc slows down every allocation and would skew the timings
+        tracemalloc.start()
+        try:
+            request()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        report[name] = {
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': max(queries),
+            'peak_kb': round(peak / 1024, 1),
+        }
+    return report
+
+
+def compare(report, baseline, tolerance=0.5, slack_ms=10):
+    """
+    Regressions of report against baseline as a list of messages.
+
+    Any extra SQL query is a regression; latency (p95) and memory may grow by
+    `tolerance` before they count, since they vary between runs and machines.
+    Latency growth below slack_ms is ignored, fast views are mostly noise.
+    """
+    regressions = []
+    for name, old in baseline.items():
+        new = report.get(name)
+        if new is None:
+            regressions.append(f'{name}: missing from report')
+            continue
+        if new['queries'] > old['queries']:
+            regressions.append(f'{name}: {new["queries"]} queries, baseline {old["queries"]}')
+        if new['p95_ms'] > max(old['p95_ms'] * (1 + tolerance), old['p95_ms'] + slack_ms):
+            regressions.append(f'{name}: p95 {new["p95_ms"]} ms, baseline {old["p95_ms"]} ms')
+        if new['peak_kb'] > old['peak_kb'] * (1 + tolerance):
+            regressions.append(f'{name}: peak {new["peak_kb"]} KB, baseline {old["peak_kb"]} KB')
+    return regressions
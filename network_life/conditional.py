@@ -0,0 +1,76 @@
+import hashlib
+import os
+
+from django.contrib.messages import get_messages
+from django.db.models import Count, Exists, OuterRef, Subquery
+from django.middleware.csrf import get_token
+
+from .models import ProfilePage, Post, Followers, Recommendation
+
+_templates_stamp = None
+
+
+def templates_stamp():
+    # changes with every deploy that touches a template, so browsers don't keep old markup
+    global _templates_stamp
+    if _templates_stamp is None:
+        root = os.path.join(os.path.dirname(__file__), 'templates')
+        _templates_stamp = max((os.path.getmtime(os.path.join(folder, name))
+                                for folder, _, names in os.walk(root) for name in names), default=0)
+    return _templates_stamp
+
+
+def page_etag(request, state):
+    """
+    ETag of a page for the viewer, None when the page must not be revalidated.
+
+    state holds the versions of the data the page shows. The viewer, their
+    CSRF cookie (its token is rendered into the forms) and the query string
+    are added here. Pages with pending flash messages get no ETag, the
+    messages have to be rendered and consumed.
+    """
+    if state is None or len(get_messages(request)):
+        return None
+    # makes sure the CSRF secret exists (and is sent as a cookie) before it goes into the ETag
+    get_token(request)
+    key = repr((
+        templates_stamp(), request.user.pk, request.META['CSRF_COOKIE'],
+        sorted(request.GET.items()), request.headers.get('x-requested-with'),
+        # avatars are CloudinaryResources, their repr holds a memory address
+        [getattr(value, 'public_id', value) for value in state],
+    ))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def recommendations_stamp(request):
+    # the last refresh of the viewer's "who to follow"
+    return Subquery(Recommendation.objects.filter(user_id=request.user.pk)
+                    .order_by('-computed_at').values('computed_at')[:1])
+
+
+def home_etag(request):
+    # newest post (new posts) and latest card change (likes, tags, edits), both read from an index;
+    # the viewer's following_count and recommendations for "who to follow"
+    state = (ProfilePage.objects.filter(pk=request.user.pk)
+             .annotate(last_post=Subquery(Post.objects.order_by('-id').values('id')[:1]),
+                       last_change=Subquery(Post.objects.filter(updated_at__isnull=False)
+                                            .order_by('-updated_at').values('updated_at')[:1]),
+                       recommended=recommendations_stamp(request))
+             .values_list('avatar', 'last_post', 'last_change', 'following_count', 'recommended').first())
+    return page_etag(request, state)
+
+
+def profile_etag(request, username):
+    posts = Post.objects.filter(user__username=OuterRef('username'))
+    state = (ProfilePage.objects.filter(username=username)
+             .annotate(last_post=Subquery(posts.order_by('-id').values('id')[:1]),
+                       amount_posts=Subquery(posts.values('user').annotate(amount=Count('*')).values('amount')),
+                       followed=Exists(Followers.objects.filter(follower_id=request.user.pk,
+                                                                followee__username=OuterRef('username'))),
+                       # the navbar avatar
+                       viewer_avatar=Subquery(ProfilePage.objects.filter(pk=request.user.pk).values('avatar')[:1]),
+                       # shown on the viewer's own profile, where following_count is theirs
+                       recommended=recommendations_stamp(request))
+             .values_list('avatar', 'followers_count', 'following_count', 'last_post', 'amount_posts', 'followed',
+                          'viewer_avatar', 'recommended').first())
+    return page_etag(request, state)
@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject
+
+from .models import ProfilePage
+
+DEFAULT_PROFILE_CACHE_TIMEOUT = 300
+
+
+def profile_cache_key(user_id):
+    return f'network_life:profile:{user_id}'
+
+
+def get_cached_profile(user_id):
+    """ProfilePage of a user (pk == user id), served from the cache when possible."""
+    key = profile_cache_key(user_id)
+    profile = cache.get(key)
+    if profile is None:
+        profile = ProfilePage.objects.filter(pk=user_id).first()
+        if profile is not None:
+            cache.set(key, profile, getattr(settings, 'PROFILE_CACHE_TIMEOUT', DEFAULT_PROFILE_CACHE_TIMEOUT))
+    return profile
+
+
+def invalidate_profile(user_id):
+    cache.delete(profile_cache_key(user_id))
+
+
+def avatar(request):
+    # navbar avatar of the current user, loaded only if a template renders it
+    if not request.user.is_authenticated:
+        return {}
+
+    def load():
+        profile = get_cached_profile(request.user.id)
+        return profile.avatar if profile is not None else None
+
+    return {'avatar': SimpleLazyObject(load)}
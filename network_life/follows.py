@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import ProfilePage, Followers
+from .recommendations import mark_stale
+
+
+def toggle_follow(follower, followee):
+    """
+    Follow or unfollow an account in one transaction, returns True if now following.
+
+    The follow row and both ProfilePage counters change together, and the
+    follower's recommendations are marked for the next refresh.
+    """
+    with transaction.atomic():
+        deleted, _ = Followers.objects.filter(follower=follower, followee=followee).delete()
+        followed = not deleted
+        if followed:
+            Followers.objects.create(follower=follower, followee=followee)
+
+        delta = 1 if followed else -1
+        ProfilePage.objects.filter(username=followee.username).update(followers_count=F('followers_count') + delta)
+        ProfilePage.objects.filter(username=follower.username).update(following_count=F('following_count') + delta)
+        # picked up by refresh_recommendations --incremental
+        mark_stale(follower)
+    return followed
+
+
+def recount_follows():
+    """Recompute every ProfilePage follower/following counter from the Followers table."""
+    def amount(field):
+        return Coalesce(Subquery(
+            Followers.objects.filter(**{f'{field}__username': OuterRef('username')})
+            .values(f'{field}_id').annotate(amount=Count('*')).values('amount')
+        ), Value(0))
+
+    return ProfilePage.objects.update(followers_count=amount('followee'), following_count=amount('follower'))
@@ -20,7 +20,8 @@ class PostForm(ModelForm):
 
     class Meta:
         model = Post
-        exclude = ['user', 'date_published', 'likes', 'name', 'preview']
+        exclude = ['user', 'date_published', 'likes', 'like_count', 'version', 'updated_at', 'trending_score', 'name',
+                   'preview']
 
 
 class ImageForm(ModelForm):
@@ -0,0 +1,95 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.middleware.csrf import get_token
+from django.template.loader import get_template, render_to_string
+
+from .likes import liked_post_ids
+from .models import Post
+
+DEFAULT_FRAGMENT_CACHE_TIMEOUT = 3600
+# where the per-viewer like form goes into a cached post card
+LIKE_FORM_MARKER = '<!--like-form-->'
+
+
+def fragment_key(kind, post):
+    # a new version means a new key, stale fragments are never read again and just expire
+    return f'network_life:{kind}:{post.id}:{post.version}'
+
+
+def bump_version(post_id):
+    Post.objects.filter(id=post_id).touch()
+
+
+class FragmentStats:
+    """Hit and miss counters per fragment kind of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def add(self, kind, hits, misses):
+        with self.lock:
+            counts = self.counts.setdefault(kind, {'hits': 0, 'misses': 0})
+            counts['hits'] += hits
+            counts['misses'] += misses
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                kind: {**counts, 'hit_rate': round(counts['hits'] / max(1, counts['hits'] + counts['misses']), 3)}
+                for kind, counts in self.counts.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.counts.clear()
+
+
+fragment_stats = FragmentStats()
+
+
+def cached_fragments(kind, posts, render):
+    """
+    Rendered fragment of every post. render(posts) gets only the posts
+    missing from the cache and returns their fragments in the same order.
+    One get_many and at most one set_many per call.
+    """
+    keys = [fragment_key(kind, post) for post in posts]
+    fragments = cache.get_many(keys)
+    missing = {key: post for key, post in zip(keys, posts) if key not in fragments}
+    if missing:
+        rendered = dict(zip(missing, render(list(missing.values()))))
+        cache.set_many(rendered, getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', DEFAULT_FRAGMENT_CACHE_TIMEOUT))
+        fragments.update(rendered)
+    fragment_stats.add(kind, len(keys) - len(missing), len(missing))
+    return [fragments[key] for key in keys]
+
+
+def render_post_cards(posts, request):
+    """
+    Feed cards of posts. The card markup is cached per post version; the like
+    form carries the viewer's CSRF token and whether they like the post, so
+    it is rendered per request and spliced in at LIKE_FORM_MARKER.
+    """
+    def render(posts):
+        prefetch_related_objects(posts, 'tags')
+        return [render_to_string('post_card.html', {'el': post}) for post in posts]
+
+    cards = cached_fragments('card', posts, render)
+    like_form = get_template('post_card_like.html')
+    csrf_token = get_token(request)
+    liked = liked_post_ids(request.user, [post.id for post in posts]) if posts else set()
+    html = []
+    for post, card in zip(posts, cards):
+        head, tail = card.split(LIKE_FORM_MARKER, 1)
+        html += [head, like_form.render({'el': post, 'liked': post.id in liked, 'csrf_token': csrf_token}), tail]
+    return ''.join(html)
+
+
+def render_post_detail(post, images):
+    # images is a lazy queryset, it is only run on a cache miss
+    return cached_fragments('post', [post], lambda posts: [render_to_string(
+        'post_detail.html', {'post': post, 'images': images})])[0]
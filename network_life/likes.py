@@ -0,0 +1,264 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+
+from .live import publish_like_counts
+from .models import Post
+from .trending import score_change
+
+logger = logging.getLogger(__name__)
+
+PostLike = Post.likes.through
+
+
+def toggle_like(post_id, user):
+    """
+    Like or unlike a post, returns (liked, like_count).
+
+    With LIKES_BUFFERED the intent goes to like_buffer and is written later
+    in a batch, otherwise it is written right away. Raises Post.DoesNotExist
+    for an unknown post.
+    """
+    if getattr(settings, 'LIKES_BUFFERED', False):
+        return like_buffer.toggle(post_id, user.id)
+    return _toggle_like_now(post_id, user.id)
+
+
+def _toggle_like_now(post_id, user_id):
+    # the through row and Post.like_count change together, so the counter
+    # never drifts from the likes table
+    with transaction.atomic():
+        deleted, _ = PostLike.objects.filter(post_id=post_id, user_id=user_id).delete()
+        liked = not deleted
+
+        delta = 1 if liked else -1
+        if liked:
+            # a concurrent click of the same user may have inserted it first: already liked, and counted by
+            # that click. Skipped by the insert itself, an IntegrityError would need a savepoint around it
+            with connection.cursor() as cursor:
+                cursor.execute(f'INSERT INTO {PostLike._meta.db_table} (post_id, user_id) VALUES (%s, %s) '
+                               'ON CONFLICT DO NOTHING', [post_id, user_id])
+                delta = cursor.rowcount
+        if delta and not Post.objects.filter(id=post_id).touch(like_count=F('like_count') + delta,
+                                                               trending_score=score_change(delta)):
+            raise Post.DoesNotExist
+
+        like_count = Post.objects.filter(id=post_id).values_list('like_count', flat=True).get()
+        transaction.on_commit(lambda: publish_like_counts({post_id: like_count}))
+    return liked, like_count
+
+
+def set_likes(intents, user):
+    """
+    Apply {post_id: liked} intents of user, returns {post_id: (liked, like_count)}.
+
+    Intents say what the user wants, not what to flip, so sending the same
+    batch twice changes nothing. Unknown posts are left out of the result.
+    """
+    if getattr(settings, 'LIKES_BUFFERED', False):
+        post_ids = Post.objects.filter(id__in=intents).values_list('id', flat=True)
+        return {post_id: like_buffer.set(post_id, user.id, intents[post_id]) for post_id in post_ids}
+    return _set_likes_now(intents, user.id)
+
+
+def _set_likes_now(intents, user_id):
+    # a fixed number of queries for the whole batch
+    with transaction.atomic():
+        # locks the posts where the database can, so concurrent batches count every change once
+        post_ids = list(Post.objects.select_for_update().filter(id__in=intents).order_by('id')
+                        .values_list('id', flat=True))
+        stored = set(PostLike.objects.filter(post_id__in=post_ids, user_id=user_id).values_list('post_id', flat=True))
+        added = [post_id for post_id in post_ids if intents[post_id] and post_id not in stored]
+        removed = [post_id for post_id in post_ids if not intents[post_id] and post_id in stored]
+
+        if added:
+            PostLike.objects.bulk_create(PostLike(post_id=post_id, user_id=user_id) for post_id in added)
+            Post.objects.filter(id__in=added).touch(like_count=F('like_count') + 1, trending_score=score_change(1))
+        if removed:
+            PostLike.objects.filter(post_id__in=removed, user_id=user_id).delete()
+            Post.objects.filter(id__in=removed).touch(like_count=F('like_count') - 1, trending_score=score_change(-1))
+
+        like_counts = dict(Post.objects.filter(id__in=post_ids).values_list('id', 'like_count'))
+        transaction.on_commit(lambda: publish_like_counts(like_counts))
+    return {post_id: (bool(intents[post_id]), like_counts[post_id]) for post_id in post_ids}
+
+
+def liked_post_ids(user, post_ids):
+    """The ids among post_ids that user likes, buffered clicks included."""
+    liked = set(PostLike.objects.filter(post_id__in=post_ids, user_id=user.id).values_list('post_id', flat=True))
+    if getattr(settings, 'LIKES_BUFFERED', False):
+        for post_id, wanted in like_buffer.pending_for(user.id, post_ids).items():
+            if wanted:
+                liked.add(post_id)
+            else:
+                liked.discard(post_id)
+    return liked
+
+
+class LikeBuffer:
+    """
+    Coalesces like/unlike intents in memory and writes them in batches.
+
+    Intents are kept per post as {user_id: (stored, wanted)}: what the
+    database had when the user first clicked and what they want now. Clicking
+    back and forth only flips `wanted`, so a flush writes at most one row per
+    (post, user) and nothing at all for pairs that ended where they started.
+    Reads go through the buffer, the batch being flushed included until it is
+    committed, so a user always sees their own clicks.
+    """
+
+    def __init__(self, flush_size=500, flush_interval=1.0):
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._pending = {}
+        # the intents being written by flush(), until they are committed
+        self._flushing = {}
+        self._size = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def toggle(self, post_id, user_id):
+        return self.set(post_id, user_id)
+
+    def set(self, post_id, user_id, liked=None):
+        """Buffer that user_id likes post_id (or not), liked=None flips. Returns (liked, like_count)."""
+        # only reads here, the write lock is taken by the flush
+        like_count = Post.objects.filter(id=post_id).values_list('like_count', flat=True).get()
+        with self._lock:
+            known = user_id in self._pending.get(post_id, {})
+            in_flight = self._flushing.get(post_id, {}).get(user_id)
+        if known:
+            stored = None
+        elif in_flight is not None:
+            # what the flush on its way is writing, the database doesn't have it yet
+            stored = in_flight[1]
+        else:
+            stored = PostLike.objects.filter(post_id=post_id, user_id=user_id).exists()
+
+        with self._lock:
+            post_intents = self._pending.setdefault(post_id, {})
+            if user_id in post_intents:
+                stored, wanted = post_intents[user_id]
+            else:
+                wanted = stored
+                self._size += 1
+            liked = (not wanted) if liked is None else bool(liked)
+            post_intents[user_id] = (stored, liked)
+            like_count += self._delta(post_intents) + self._delta(self._flushing.get(post_id, {}))
+            full = self._size >= self.flush_size
+            self._schedule()
+
+        # the count everyone will see once the buffer is flushed
+        publish_like_counts({post_id: like_count})
+        if full:
+            self.flush()
+        return liked, like_count
+
+    @staticmethod
+    def _delta(post_intents):
+        return sum(int(wanted) - int(stored) for stored, wanted in post_intents.values())
+
+    def pending_delta(self, post_id):
+        with self._lock:
+            return self._delta(self._pending.get(post_id, {})) + self._delta(self._flushing.get(post_id, {}))
+
+    def pending_for(self, user_id, post_ids):
+        """{post_id: wanted} of the buffered intents of user_id, the newest click first."""
+        with self._lock:
+            wanted = {}
+            for post_id in post_ids:
+                for intents in (self._pending, self._flushing):
+                    if user_id in intents.get(post_id, {}):
+                        wanted[post_id] = intents[post_id][user_id][1]
+                        break
+            return wanted
+
+    def _schedule(self):
+        # called with self._lock held
+        if self._timer is None and self.flush_interval:
+            self._timer = threading.Timer(self.flush_interval, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        """Write every pending intent; returns the number of rows changed."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending, self._size = self._pending, {}, 0
+                self._flushing = pending
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not pending:
+                return 0
+
+            try:
+                written = self._write(pending)
+            except Exception:
+                logger.exception('Flushing %d buffered likes failed, keeping them for the next flush',
+                                 sum(len(intents) for intents in pending.values()))
+                self._restore(pending)
+                raise
+            finally:
+                with self._lock:
+                    self._flushing = {}
+            return written
+
+    def _write(self, pending):
+        # the intents say what every user wants, the rows what is stored now: the counters change by the
+        # rows really inserted and deleted, whatever `stored` a click saw
+        with transaction.atomic():
+            # locks the posts where the database can, like _set_likes_now; posts deleted meanwhile are skipped
+            post_ids = list(Post.objects.select_for_update().filter(id__in=pending).order_by('id')
+                            .values_list('id', flat=True))
+            user_ids = {user_id for post_id in post_ids for user_id in pending[post_id]}
+            existing = set(PostLike.objects.filter(post_id__in=post_ids, user_id__in=user_ids)
+                           .values_list('post_id', 'user_id'))
+
+            added, removed, deltas, deleted = [], Q(), {}, 0
+            for post_id in post_ids:
+                intents = pending[post_id]
+                liked = [user_id for user_id, (_, wanted) in intents.items()
+                         if wanted and (post_id, user_id) not in existing]
+                unliked = [user_id for user_id, (_, wanted) in intents.items()
+                           if not wanted and (post_id, user_id) in existing]
+                added.extend(PostLike(post_id=post_id, user_id=user_id) for user_id in liked)
+                if unliked:
+                    removed |= Q(post_id=post_id, user_id__in=unliked)
+                    deleted += len(unliked)
+                if len(liked) != len(unliked):
+                    deltas[post_id] = len(liked) - len(unliked)
+
+            if added:
+                PostLike.objects.bulk_create(added, ignore_conflicts=True)
+            if removed:
+                PostLike.objects.filter(removed).delete()
+            for post_id, delta in deltas.items():
+                Post.objects.filter(id=post_id).touch(like_count=F('like_count') + delta,
+                                                      trending_score=score_change(delta))
+        return len(added) + deleted
+
+    def _restore(self, pending):
+        with self._lock:
+            for post_id, intents in pending.items():
+                current = self._pending.setdefault(post_id, {})
+                for user_id, (stored, wanted) in intents.items():
+                    if user_id in current:
+                        # clicked again since the snapshot, keep the original stored state
+                        current[user_id] = (stored, current[user_id][1])
+                    else:
+                        current[user_id] = (stored, wanted)
+                        self._size += 1
+            self._schedule()
+
+
+like_buffer = LikeBuffer(
+    flush_size=getattr(settings, 'LIKES_FLUSH_SIZE', 500),
+    flush_interval=getattr(settings, 'LIKES_FLUSH_INTERVAL', 1.0),
+)
+atexit.register(like_buffer.flush)
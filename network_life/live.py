@@ -0,0 +1,259 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import timedelta
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections, connection
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Post
+
+DEFAULT_INTERVAL = 2.0
+DEFAULT_HEARTBEAT = 15.0
+DEFAULT_MAX_POSTS = 200
+DEFAULT_MAX_SECONDS = 300
+# a like committed up to this long after a poll started may carry an older updated_at
+POLL_OVERLAP = timedelta(seconds=2)
+
+
+class LikeCountHub:
+    """
+    Latest like count of recently changed posts, for the live streams of
+    this process.
+
+    Every change gets a sequence number and a stream asks what changed after
+    the last number it saw, so a count that changes many times within one
+    interval is sent once, with its newest value. Only the max_tracked most
+    recently changed posts are kept; a stream that fell further behind is
+    told so and reads its counts from the database.
+
+    Sequence numbers only mean something to this hub, so they are sent
+    along with its epoch, a random id of the process' hub.
+    """
+
+    def __init__(self, max_tracked=10000):
+        self.max_tracked = max_tracked
+        self.lock = threading.Lock()
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seq = 0
+        # post_id -> (seq, like_count), oldest change first
+        self.counts = OrderedDict()
+        # changes up to floor may have been dropped
+        self.floor = 0
+        self.polled_until = None
+        self.next_poll = 0
+
+    def publish(self, counts):
+        """Record {post_id: like_count}, unchanged counts are ignored."""
+        with self.lock:
+            for post_id, like_count in counts.items():
+                current = self.counts.get(post_id)
+                if current is not None and current[1] == like_count:
+                    continue
+                self.seq += 1
+                self.counts.pop(post_id, None)
+                self.counts[post_id] = (self.seq, like_count)
+            while len(self.counts) > self.max_tracked:
+                _, (self.floor, _) = self.counts.popitem(last=False)
+
+    def changes(self, post_ids, since):
+        """
+        ({post_id: like_count} of post_ids changed after since, current seq).
+        The counts are None if changes after since were dropped.
+        """
+        with self.lock:
+            if since < self.floor:
+                return None, self.seq
+            changed = {}
+            for post_id in post_ids:
+                entry = self.counts.get(post_id)
+                if entry is not None and entry[0] > since:
+                    changed[post_id] = entry[1]
+            return changed, self.seq
+
+    def poll_due(self, interval):
+        # one database poll per interval for the whole process, however many streams are open
+        with self.lock:
+            now = time.monotonic()
+            if now < self.next_poll:
+                return False
+            self.next_poll = now + interval
+            return True
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+    def parse_event_id(self, event_id):
+        """The seq of an event id sent by this hub, None for ids of another process or an earlier hub."""
+        epoch, _, seq = event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.seq:
+            return None
+        return int(seq)
+
+    def reset(self):
+        with self.lock:
+            self.epoch = uuid.uuid4().hex[:12]
+            self.seq = self.floor = self.next_poll = 0
+            self.counts.clear()
+            self.polled_until = None
+
+
+hub = LikeCountHub()
+
+
+def publish_like_counts(counts):
+    hub.publish(counts)
+
+
+def poll_database():
+    """
+    Publish the like counts of posts changed since the last poll, so likes
+    written by other processes reach this process' streams too. One query
+    on the updated_at index.
+    """
+    started = timezone.now()
+    since, hub.polled_until = hub.polled_until, started
+    if since is None:
+        # the first poll only marks where the next one starts
+        return
+    changed = (Post.objects.filter(updated_at__gte=since - POLL_OVERLAP).order_by('updated_at')
+               .values_list('id', 'like_count')[:hub.max_tracked])
+    hub.publish(dict(changed))
+
+
+def current_counts(post_ids):
+    return dict(Post.objects.filter(id__in=post_ids).values_list('id', 'like_count'))
+
+
+def scope_user(scope):
+    # the session cookie, read the way SessionMiddleware and AuthenticationMiddleware do
+    cookies = SimpleCookie()
+    for name, value in scope.get('headers', []):
+        if name == b'cookie':
+            cookies.load(value.decode('latin1'))
+    request = HttpRequest()
+    session_key = cookies[settings.SESSION_COOKIE_NAME].value if settings.SESSION_COOKIE_NAME in cookies else None
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    return get_user(request)
+
+
+def database_sync_to_async(func):
+    # this connection lives outside Django's request cycle, drop it when it went stale
+    def wrapper(*args, **kwargs):
+        # unless it is in the middle of a transaction, as a thread sensitive call can share one (the tests' atomic block)
+        if not connection.in_atomic_block:
+            close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if not connection.in_atomic_block:
+                close_old_connections()
+    return sync_to_async(wrapper)
+
+
+def parse_posts(query_string):
+    max_posts = getattr(settings, 'LIVE_LIKES_MAX_POSTS', DEFAULT_MAX_POSTS)
+    values = parse_qs(query_string.decode('latin1')).get('posts', [''])[0]
+    return [int(value) for value in values.split(',') if value.isdigit()][:max_posts]
+
+
+def likes_event(seq, counts):
+    data = json.dumps({str(post_id): like_count for post_id, like_count in counts.items()})
+    return f'id: {hub.event_id(seq)}\nevent: likes\ndata: {data}\n\n'.encode()
+
+
+async def stream_likes(scope, receive, send):
+    """
+    Server-sent events with the like counts of the posts in ?posts=1,2,3.
+
+    The first event holds their current counts. After that, every
+    LIVE_LIKES_INTERVAL seconds the counts that changed are sent in one
+    event, and a comment is sent every LIVE_LIKES_HEARTBEAT seconds
+    otherwise. The stream ends after LIVE_LIKES_MAX_SECONDS; the browser
+    reconnects with Last-Event-ID and continues where it stopped, or gets
+    the current counts again when it reconnects to another process.
+    """
+    interval = getattr(settings, 'LIVE_LIKES_INTERVAL', DEFAULT_INTERVAL)
+    heartbeat = getattr(settings, 'LIVE_LIKES_HEARTBEAT', DEFAULT_HEARTBEAT)
+    poll = getattr(settings, 'LIVE_LIKES_POLL_DATABASE', True)
+
+    user = await database_sync_to_async(scope_user)(scope)
+    if not user.is_authenticated:
+        await send({'type': 'http.response.start', 'status': 401,
+                    'headers': [(b'Content-Type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': b'{"error": "Authentication required"}'})
+        return
+
+    post_ids = parse_posts(scope.get('query_string', b''))
+    last_event_id = dict(scope.get('headers', [])).get(b'last-event-id', b'').decode('latin1')
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'Content-Type', b'text/event-stream'), (b'Cache-Control', b'no-cache'), (b'X-Accel-Buffering', b'no'),
+    ]})
+
+    disconnected = asyncio.Event()
+
+    async def watch():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    watcher = asyncio.create_task(watch())
+    try:
+        since = hub.parse_event_id(last_event_id)
+        if since is None:
+            since = hub.seq
+            await send({'type': 'http.response.body', 'more_body': True,
+                        'body': b'retry: 5000\n' + likes_event(since, await database_sync_to_async(current_counts)(post_ids))})
+
+        deadline = time.monotonic() + getattr(settings, 'LIVE_LIKES_MAX_SECONDS', DEFAULT_MAX_SECONDS)
+        quiet_since = time.monotonic()
+        while time.monotonic() < deadline:
+            try:
+                await asyncio.wait_for(disconnected.wait(), interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            if poll and hub.poll_due(interval):
+                await database_sync_to_async(poll_database)()
+
+            counts, seq = hub.changes(post_ids, since)
+            if counts is None:
+                counts = await database_sync_to_async(current_counts)(post_ids)
+            since = seq
+            if counts:
+                body, quiet_since = likes_event(seq, counts), time.monotonic()
+            elif time.monotonic() - quiet_since >= heartbeat:
+                # keeps proxies from closing an idle connection
+                body, quiet_since = b': keep-alive\n\n', time.monotonic()
+            else:
+                continue
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+
+
+def live_likes(application):
+    """Wraps the Django ASGI application, the live likes stream is answered before Django."""
+    path = None
+
+    async def app(scope, receive, send):
+        nonlocal path
+        if path is None:
+            path = reverse('network_life:live_likes')
+        if scope['type'] == 'http' and scope['path'] == path:
+            return await stream_likes(scope, receive, send)
+        return await application(scope, receive, send)
+
+    return app
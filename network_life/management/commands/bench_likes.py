@@ -0,0 +1,81 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connection, connections, OperationalError
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+
+from network_life.likes import LikeBuffer, _toggle_like_now
+from network_life.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Measure like throughput of direct and buffered writes under concurrent clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=8, help='Number of concurrent client threads')
+        parser.add_argument('--clicks', type=int, default=200, help='Like clicks per client')
+        parser.add_argument('--posts', type=int, default=3, help='Number of hot posts the clicks go to')
+        parser.add_argument('--flush-size', type=int, default=500)
+        parser.add_argument('--flush-interval', type=float, default=0.5)
+
+    def handle(self, *args, **options):
+        # a throwaway database, so the benchmark never touches real data. A file rather than SQLite's shared
+        # in-memory test database, whose table locks would not behave like the real database under concurrent writes
+        test_settings = connections[DEFAULT_DB_ALIAS].settings_dict.setdefault('TEST', {})
+        old_name = test_settings.get('NAME')
+        with tempfile.TemporaryDirectory() as root:
+            test_settings['NAME'] = os.path.join(root, 'bench_likes.sqlite3')
+            setup_test_environment()
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                self.benchmark(options)
+            finally:
+                teardown_databases(old_config, verbosity=0)
+                teardown_test_environment()
+                test_settings['NAME'] = old_name
+
+    def benchmark(self, options):
+        clients, clicks = options['clients'], options['clicks']
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'bench_likes_{i}') for i in range(clients)
+        )
+        posts = [Post.objects.create(user=users[0], name=users[0].username, main_image='bench', preview='bench',
+                                     description='bench') for _ in range(options['posts'])]
+
+        self.run('direct', _toggle_like_now, users, posts, clicks)
+
+        buffer = LikeBuffer(flush_size=options['flush_size'], flush_interval=options['flush_interval'])
+        self.run('buffered', buffer.toggle, users, posts, clicks, after=buffer.flush)
+
+    def run(self, mode, toggle, users, posts, clicks, after=None):
+        errors = []
+
+        def client(user):
+            try:
+                for i in range(clicks):
+                    try:
+                        toggle(posts[i % len(posts)].id, user.id)
+                    except OperationalError as e:
+                        # "database is locked" on SQLite
+                        errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=client, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if after is not None:
+            after()
+        elapsed = time.perf_counter() - started
+
+        total = len(users) * clicks
+        self.stdout.write(f'{mode:>8}: {total} clicks from {len(users)} clients in {elapsed:.2f}s, '
+                          f'{(total - len(errors)) / elapsed:.0f} likes/s, {len(errors)} failed')
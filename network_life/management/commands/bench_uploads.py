@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from PIL import Image as PillowImage
+
+from network_life.models import Image
+from network_life.uploads import LocalStorage, upload_files
+
+
+class SlowStorage(LocalStorage):
+    # local storage plus a fixed delay standing in for the Cloudinary round trip
+    def __init__(self, root, latency):
+        super().__init__(root)
+        self.latency = latency
+
+    def upload(self, file, field):
+        time.sleep(self.latency)
+        return super().upload(file, field)
+
+
+def jpeg_payload(size):
+    # random pixels compress to about 0.8 bytes each at quality 85, so the file lands near size bytes
+    side = max(1, int((size / 0.8) ** 0.5))
+    output = BytesIO()
+    PillowImage.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(output, 'JPEG', quality=85)
+    return output.getvalue()
+
+
+class Command(BaseCommand):
+    help = 'Compare serial and pooled image upload latency by number of attached images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=float, default=0.3, help='Simulated seconds per upload')
+        parser.add_argument('--max-images', type=int, default=8)
+        parser.add_argument('--size', type=int, default=200_000, help='Approximate bytes per JPEG image')
+
+    def handle(self, *args, **options):
+        field = Image._meta.get_field('images')
+        # a real image, LocalStorage makes its thumbnails like it does for uploaded photos
+        payload = jpeg_payload(options['size'])
+
+        with tempfile.TemporaryDirectory() as root, override_settings(THUMBNAIL_ROOT=root):
+            storage = SlowStorage(root, options['latency'])
+            self.stdout.write(f'{len(payload)} bytes per image')
+            self.stdout.write(f'{"images":>6} {"serial":>9} {"pooled":>9}')
+            amount = 1
+            while amount <= options['max_images']:
+                files = [SimpleUploadedFile(f'{i}.jpg', payload) for i in range(amount)]
+
+                started = time.perf_counter()
+                for file in files:
+                    storage.upload(file, field)
+                serial = time.perf_counter() - started
+
+                started = time.perf_counter()
+                upload_files([(file, field) for file in files], storage)
+                pooled = time.perf_counter() - started
+
+                self.stdout.write(f'{amount:>6} {serial:>8.2f}s {pooled:>8.2f}s')
+                amount *= 2
@@ -0,0 +1,68 @@
+import json
+import tempfile
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, \
+    teardown_test_environment
+
+from network_life.benchmarks import benchmark_targets, compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = ('Benchmark the main views on a seeded test database: p50/p95 latency, SQL queries and peak memory. '
+            'With --baseline, fail when a view regressed against a stored report')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500, help='Size of the seeded dataset')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed of the seeded dataset')
+        parser.add_argument('--requests', type=int, default=20, help='Measured requests per view')
+        parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests per view')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--baseline', help='JSON report to compare against')
+        parser.add_argument('--tolerance', type=float, default=0.5,
+                            help='Allowed relative growth of latency and memory (0.5 = 50%%)')
+        parser.add_argument('--slack-ms', type=float, default=10, help='Latency growth that is always allowed')
+
+    def handle(self, *args, **options):
+        # a throwaway database, so the benchmark never touches real data
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with tempfile.TemporaryDirectory() as root, override_settings(
+                    IMAGE_STORAGE='network_life.uploads.LocalStorage', LOCAL_UPLOAD_ROOT=f'{root}/uploads',
+                    THUMBNAIL_ROOT=f'{root}/thumbnails'):
+                call_command('seed_data', users=options['users'], seed=options['seed'], password='bench-password',
+                             stdout=self.stdout)
+                username, post_id = benchmark_targets()
+                client = Client()
+                client.login(username=username, password='bench-password')
+                views = run_benchmarks(client, username, post_id, options['requests'], options['warmup'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            'dataset': {'users': options['users'], 'seed': options['seed']},
+            'views': views,
+        }
+
+        self.stdout.write(f'{"view":<20} {"p50 ms":>8} {"p95 ms":>8} {"queries":>8} {"peak KB":>9}')
+        for name, row in views.items():
+            self.stdout.write(f'{name:<20} {row["p50_ms"]:>8} {row["p95_ms"]:>8} {row["queries"]:>8} '
+                              f'{row["peak_kb"]:>9}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            if baseline.get('dataset') != report['dataset']:
+                raise CommandError(f'Baseline was measured on another dataset: {baseline.get("dataset")}')
+            regressions = compare(views, baseline['views'], options['tolerance'], options['slack_ms'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from network_life.trending import DEFAULT_DECAY_INTERVAL, decay_since_last_pass
+
+
+class Command(BaseCommand):
+    help = ('Decay the trending scores of posts by the time since the previous pass, run every '
+            'TRENDING_DECAY_INTERVAL seconds or with --loop')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep decaying instead of exiting')
+        parser.add_argument('--interval', type=float,
+                            default=getattr(settings, 'TRENDING_DECAY_INTERVAL', DEFAULT_DECAY_INTERVAL),
+                            help='Seconds between passes with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.monotonic()
+            result = decay_since_last_pass()
+            if result is None:
+                self.stdout.write('Another pass decayed the scores at the same time, skipped')
+            else:
+                elapsed, trending = result
+                self.stdout.write(self.style.SUCCESS(
+                    f'Decayed {elapsed:.0f}s, {trending} posts trending ({time.monotonic() - started:.2f}s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
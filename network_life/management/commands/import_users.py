@@ -0,0 +1,38 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network_life.user_import import UserImport, read_rows
+
+
+class Command(BaseCommand):
+    help = ('Create users and their profiles from a .csv or .jsonl file (username, email, password, first_name, '
+            'last_name, bio). Run it again to resume an interrupted import')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Processes hashing passwords, 1 hashes in this process')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Users created per transaction')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['path']):
+            raise CommandError(f'{options["path"]} does not exist')
+        importer = UserImport(workers=max(1, options['workers']), batch_size=options['batch_size'])
+        started = time.perf_counter()
+        try:
+            for progress in importer.run(read_rows(options['path'])):
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f'{progress.imported} imported, {progress.skipped} skipped '
+                                  f'({progress.imported / max(elapsed, 1e-9):.0f} rows/s)')
+        except (ValueError, UnicodeError) as error:
+            # json.JSONDecodeError is a ValueError; the batches written so far are kept
+            raise CommandError(f'Unreadable input after {importer.imported} users: {error}')
+
+        for error in importer.errors:
+            self.stderr.write(error)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.imported} users in {elapsed:.1f}s ({importer.imported / max(elapsed, 1e-9):.0f} '
+            f'rows/s), {importer.skipped} skipped as existing or duplicate, {len(importer.errors)} invalid'))
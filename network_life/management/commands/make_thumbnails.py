@@ -0,0 +1,35 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from network_life.thumbnails import generate_thumbnails
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'}
+
+
+class Command(BaseCommand):
+    help = 'Generate thumbnail variants for every image in a directory using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', default=str(getattr(settings, 'LOCAL_UPLOAD_ROOT', '')),
+                            help='Directory scanned recursively for images (default LOCAL_UPLOAD_ROOT)')
+        parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+
+    def handle(self, *args, **options):
+        source = options['source']
+        jobs = []
+        for folder, _, names in os.walk(source):
+            for name in names:
+                stem, ext = os.path.splitext(name)
+                if ext.lower() in IMAGE_EXTENSIONS:
+                    # public id is the path below the source directory without the extension
+                    public_id = os.path.relpath(os.path.join(folder, stem), source).replace(os.sep, '/')
+                    jobs.append((os.path.join(folder, name), public_id))
+
+        started = time.perf_counter()
+        written = generate_thumbnails(jobs, options['workers'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {written} thumbnails for {len(jobs)} images in {time.perf_counter() - started:.1f}s'
+        ))
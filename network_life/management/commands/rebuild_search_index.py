@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from network_life.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index of posts and profiles'
+
+    def handle(self, *args, **options):
+        posts, profiles = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {posts} posts and {profiles} profiles'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from network_life.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute Post.like_count from the likes through table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000,
+                            help='Number of post ids updated per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        actual = Coalesce(Subquery(
+            Post.likes.through.objects.filter(post_id=OuterRef('pk'))
+            .values('post_id').annotate(amount=Count('*')).values('amount')
+        ), Value(0))
+
+        fixed = 0
+        last_id = 0
+        max_id = Post.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        while last_id < max_id:
+            with transaction.atomic():
+                drifted = list(Post.objects.filter(id__gt=last_id, id__lte=last_id + batch_size)
+                               .annotate(actual=actual).exclude(like_count=F('actual'))
+                               .values_list('id', flat=True))
+                if drifted:
+                    fixed += Post.objects.filter(id__in=drifted).touch(like_count=actual)
+            last_id += batch_size
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled like counters, {fixed} posts fixed'))
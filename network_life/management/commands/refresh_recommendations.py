@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from network_life.recommendations import refresh_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Recompute the "who to follow" recommendations from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--incremental', action='store_true',
+                            help='Only users whose follows changed since the last run, and their followers')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of users whose recommendations are replaced per transaction')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users, rows = refresh_recommendations(options['incremental'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recommendations refreshed for {users} users, {rows} rows in {time.perf_counter() - started:.2f}s'))
@@ -0,0 +1,200 @@
+import datetime
+import itertools
+import random
+import time
+from array import array
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+from faker import Faker
+from taggit.models import Tag, TaggedItem
+
+from network_life.follows import recount_follows
+from network_life.models import ProfilePage, Post, Followers, TimelineEntry
+from network_life.timeline import fanout_limit
+from network_life.trending import DEFAULT_HALF_LIFE, MIN_SCORE
+
+# shape of the power-law (Pareto) distributions, lower is more skewed
+ALPHA = 1.5
+
+
+class Command(BaseCommand):
+    help = ('Generate a synthetic dataset (users, profiles, posts, tags, likes, follows, timelines) '
+            'for load testing')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts-per-user', type=float, default=5, help='Average, power-law distributed')
+        parser.add_argument('--likes-per-post', type=float, default=10, help='Average, power-law distributed')
+        parser.add_argument('--follows-per-user', type=float, default=20, help='Average, power-law distributed')
+        parser.add_argument('--days', type=float, default=365, help='Posts are published over the last DAYS days')
+        parser.add_argument('--tags', type=int, default=200, help='Tag vocabulary size, used with Zipf weights')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per bulk_create and transaction')
+        parser.add_argument('--password', default='password123', help='Password of every generated user')
+        parser.add_argument('--prefix', default='seed_', help='Username prefix of generated users')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for a reproducible dataset')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        fake = Faker()
+        fake.seed_instance(options['seed'])
+        # a small pool of fake values, generating one per row would dominate the run time
+        self.first_names = [fake.first_name() for _ in range(500)]
+        self.last_names = [fake.last_name() for _ in range(500)]
+        self.sentences = [fake.sentence(nb_words=12) for _ in range(2000)]
+
+        if connection.vendor == 'sqlite' and not connection.in_atomic_block:
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+
+        self.user_ids = self.stage('users', self.create_users, options['users'], options['password'],
+                                   options['prefix'])
+        # a user's weight decides how much they post and how popular they are
+        self.weights = [self.random.paretovariate(ALPHA) for _ in self.user_ids]
+        self.stage('follows', self.create_follows, options['follows_per_user'])
+        tag_ids = self.stage('tags', self.create_tags, options['tags'])
+        self.stage('posts', self.create_posts, options['posts_per_user'], options['likes_per_post'], tag_ids,
+                   options['days'])
+        self.stdout.write(self.style.SUCCESS('Dataset generated'))
+
+    def stage(self, name, func, *args):
+        started = time.perf_counter()
+        result, rows = func(*args)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{name}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):.0f} rows/s)')
+        return result
+
+    def amount(self, mean, cap):
+        # Pareto variate scaled so that its mean is `mean`
+        return min(cap, int(mean * (ALPHA - 1) / ALPHA * self.random.paretovariate(ALPHA)))
+
+    def chunks(self, iterable):
+        iterator = iter(iterable)
+        while chunk := list(itertools.islice(iterator, self.chunk_size)):
+            yield chunk
+
+    def insert(self, model, objs):
+        # bulk_create in one transaction, returns the new ids in insertion order
+        last_id = model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        with transaction.atomic():
+            model.objects.bulk_create(objs)
+        return model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)
+
+    def create_users(self, amount, password, prefix):
+        # hashing once and reusing the hash skips a PBKDF2 run per user
+        hashed = make_password(password)
+        offset = User.objects.filter(username__startswith=prefix).count()
+        now = timezone.now()
+        user_ids = array('q')
+        rows = 0
+        for chunk in self.chunks(range(offset, offset + amount)):
+            users = [User(username=f'{prefix}{i}', email=f'{prefix}{i}@example.com', password=hashed,
+                          date_joined=now) for i in chunk]
+            ids = list(self.insert(User, users))
+            profiles = [ProfilePage(pk=user_id, username=user.username, first_name=self.random.choice(self.first_names),
+                                    second_name=self.random.choice(self.last_names),
+                                    bio=self.random.choice(self.sentences), register_date=now)
+                        for user_id, user in zip(ids, users)]
+            with transaction.atomic():
+                ProfilePage.objects.bulk_create(profiles)
+            user_ids.extend(ids)
+            rows += len(users) + len(profiles)
+        return user_ids, rows
+
+    def create_follows(self, mean):
+        # popular users are followed more often (preferential attachment)
+        cum_weights = list(itertools.accumulate(self.weights))
+        edges = ((follower, followee)
+                 for follower in self.user_ids
+                 for followee in set(self.random.choices(self.user_ids, cum_weights=cum_weights,
+                                                         k=self.amount(mean, len(self.user_ids) - 1)))
+                 if followee != follower)
+        # followee -> follower ids, for the timeline fan-out of the posts
+        self.followers = defaultdict(lambda: array('q'))
+        rows = 0
+        for chunk in self.chunks(edges):
+            with transaction.atomic():
+                Followers.objects.bulk_create([Followers(follower_id=a, followee_id=b) for a, b in chunk])
+            for follower, followee in chunk:
+                self.followers[followee].append(follower)
+            rows += len(chunk)
+        recount_follows()
+        return None, rows
+
+    def create_tags(self, amount):
+        names = [f'{word}{i}' for i, word in enumerate(self.random.choices(
+            ['sport', 'relax', 'travelling', 'studying', 'food', 'music', 'art', 'nature', 'city', 'friends'], k=amount
+        ))]
+        existing = set(Tag.objects.filter(name__in=names).values_list('name', flat=True))
+        with transaction.atomic():
+            Tag.objects.bulk_create([Tag(name=name, slug=slugify(name)) for name in names if name not in existing])
+        tag_ids = list(Tag.objects.filter(name__in=names).values_list('id', flat=True))
+        return tag_ids, len(names) - len(existing)
+
+    def trending_score(self, like_count, age):
+        # what the likes are worth after decay, each one given at a random moment since publication
+        half_life = getattr(settings, 'TRENDING_HALF_LIFE', DEFAULT_HALF_LIFE)
+        score = sum(0.5 ** (self.random.uniform(0, age) / half_life) for _ in range(like_count))
+        return score if score >= MIN_SCORE else 0.0
+
+    def create_posts(self, posts_mean, likes_mean, tag_ids, days):
+        post_type = ContentType.objects.get_for_model(Post)
+        usernames = {}
+        # Zipf weights: the k-th tag is used ~1/k as often as the first
+        tag_weights = list(itertools.accumulate(1 / k for k in range(1, len(tag_ids) + 1)))
+        now = timezone.now()
+        mean_weight = ALPHA / (ALPHA - 1)
+        limit = fanout_limit()
+
+        def posts():
+            for user_id, weight in zip(self.user_ids, self.weights):
+                for _ in range(min(1000, int(posts_mean * weight / mean_weight))):
+                    yield user_id
+
+        rows = 0
+        for chunk in self.chunks(posts()):
+            missing = set(chunk) - usernames.keys()
+            if missing:
+                usernames.update(User.objects.filter(id__in=missing).values_list('id', 'username'))
+            like_counts = [self.amount(likes_mean, len(self.user_ids)) for _ in chunk]
+            ages = [self.random.uniform(0, days * 86400) for _ in chunk]
+            new_posts = [Post(user_id=user_id, name=usernames[user_id], main_image='sample', preview='sample',
+                              description=self.random.choice(self.sentences), like_count=like_count,
+                              trending_score=self.trending_score(like_count, age),
+                              date_published=now - datetime.timedelta(seconds=age))
+                         for user_id, like_count, age in zip(chunk, like_counts, ages)]
+            post_ids = list(self.insert(Post, new_posts))
+
+            likes = [Post.likes.through(post_id=post_id, user_id=user_id)
+                     for post_id, like_count in zip(post_ids, like_counts)
+                     for user_id in self.random.sample(self.user_ids, like_count)]
+            tags = [TaggedItem(content_type=post_type, object_id=post_id, tag_id=tag_id)
+                    for post_id in post_ids
+                    for tag_id in set(self.random.choices(tag_ids, cum_weights=tag_weights,
+                                                          k=self.random.randint(1, 3)))] if tag_ids else []
+            # what fan_out_post does for a published post: the author's timeline and, unless the author has
+            # more than TIMELINE_FANOUT_LIMIT followers, the timelines of their followers
+            timeline = (TimelineEntry(owner_id=owner_id, post_id=post_id, author_id=post.user_id,
+                                      date_published=post.date_published)
+                        for post_id, post in zip(post_ids, new_posts)
+                        for owner_id in itertools.chain(
+                            (post.user_id,),
+                            self.followers[post.user_id] if len(self.followers[post.user_id]) <= limit else ()))
+            timeline_rows = 0
+            with transaction.atomic():
+                for batch in self.chunks(likes):
+                    Post.likes.through.objects.bulk_create(batch)
+                TaggedItem.objects.bulk_create(tags, batch_size=self.chunk_size)
+                for batch in self.chunks(timeline):
+                    TimelineEntry.objects.bulk_create(batch)
+                    timeline_rows += len(batch)
+            rows += len(new_posts) + len(likes) + len(tags) + timeline_rows
+        return None, rows
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from network_life.outbox import send_queued
+
+
+class Command(BaseCommand):
+    help = 'Send e-mails queued in the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='E-mails sent per SMTP connection')
+        parser.add_argument('--max-attempts', type=int, default=None)
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = send_queued(options['batch_size'], options['max_attempts'])
+            # a full batch means there may be more due right away
+            while sent + failed == options['batch_size']:
+                self.report(sent, failed)
+                sent, failed = send_queued(options['batch_size'], options['max_attempts'])
+            self.report(sent, failed)
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def report(self, sent, failed):
+        if sent or failed:
+            self.stdout.write(self.style.SUCCESS(f'Sent {sent} e-mails, {failed} failed'))
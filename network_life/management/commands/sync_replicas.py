@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from network_life.routers import replicas, sync_replicas
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database over the local read replicas (DB_REPLICAS)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep syncing instead of exiting')
+        parser.add_argument('--interval', type=float, default=2.0,
+                            help='Seconds between syncs with --loop, the simulated replication lag')
+
+    def handle(self, *args, **options):
+        if not replicas():
+            raise CommandError('No replicas configured, set DB_REPLICAS')
+        while True:
+            started = time.perf_counter()
+            synced = sync_replicas()
+            self.stdout.write(self.style.SUCCESS(
+                f'Synced {", ".join(synced)} in {time.perf_counter() - started:.2f}s'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
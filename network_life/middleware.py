@@ -0,0 +1,179 @@
+import bisect
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger('network_life.requests')
+
+DEFAULT_N_PLUS_ONE = 5
+# upper bounds (ms) of the latency histogram buckets, the last bucket is open
+BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def fingerprint(sql):
+    """SQL with its parameter lists collapsed, so queries that differ only in their values match."""
+    sql = re.sub(r'\(\s*%s(?:\s*,\s*%s)*\s*\)', '(...)', sql)
+    sql = re.sub(r"'[^']*'|\b\d+\b", '?', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.db_time = 0.0
+        self.template_time = 0.0
+        # templates rendered inside a template (the post card fragments) are part of the outer one
+        self.render_depth = 0
+
+    def execute(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook, runs around every query of the request
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries.append((sql, repr(params)))
+
+    def duplicates(self):
+        return sum(count - 1 for count in Counter(self.queries).values() if count > 1)
+
+    def similar(self, threshold):
+        """Fingerprints run at least threshold times, most likely an N+1 loop."""
+        counts = Counter(fingerprint(sql) for sql, params in self.queries)
+        return {sql: count for sql, count in counts.most_common() if count >= threshold}
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        metrics = _current.get()
+        if metrics is None or metrics.render_depth:
+            return render(self, *args, **kwargs)
+        metrics.render_depth += 1
+        started, db_time = time.perf_counter(), metrics.db_time
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            metrics.render_depth -= 1
+            # queries run while rendering are already in the db time
+            metrics.template_time += time.perf_counter() - started - (metrics.db_time - db_time)
+    wrapper.timed = True
+    return wrapper
+
+
+class RequestStats:
+    """Per URL name request count, query count and latency histogram of this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def add(self, name, wall_ms, queries, db_ms):
+        with self.lock:
+            view = self.views.setdefault(name, {
+                'requests': 0, 'queries': 0, 'db_ms': 0.0, 'wall_ms': 0.0, 'max_queries': 0,
+                'histogram': [0] * (len(BUCKETS_MS) + 1),
+            })
+            view['requests'] += 1
+            view['queries'] += queries
+            view['max_queries'] = max(view['max_queries'], queries)
+            view['db_ms'] += db_ms
+            view['wall_ms'] += wall_ms
+            view['histogram'][bisect.bisect_left(BUCKETS_MS, wall_ms)] += 1
+
+    def snapshot(self):
+        labels = [f'<={bound}ms' for bound in BUCKETS_MS] + [f'>{BUCKETS_MS[-1]}ms']
+        with self.lock:
+            return {
+                name: {
+                    'requests': view['requests'],
+                    'avg_queries': round(view['queries'] / view['requests'], 2),
+                    'max_queries': view['max_queries'],
+                    'avg_db_ms': round(view['db_ms'] / view['requests'], 2),
+                    'avg_wall_ms': round(view['wall_ms'] / view['requests'], 2),
+                    'histogram': dict(zip(labels, view['histogram'])),
+                }
+                for name, view in self.views.items()
+            }
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+request_stats = RequestStats()
+
+
+class RequestMetricsMiddleware:
+    """
+    Opt-in (REQUEST_METRICS) per request instrumentation: SQL query count, DB
+    time, duplicate and N+1 queries, template render time and wall time. They
+    are sent back as a Server-Timing header, logged as one JSON line to the
+    network_life.requests logger and aggregated in request_stats.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_METRICS', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.n_plus_one = getattr(settings, 'REQUEST_METRICS_N_PLUS_ONE', DEFAULT_N_PLUS_ONE)
+        if not getattr(Template.render, 'timed', False):
+            Template.render = _timed_render(Template.render)
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            with self.wrap_connections(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        wall_ms = (time.perf_counter() - metrics.started) * 1000
+        db_ms = metrics.db_time * 1000
+        template_ms = metrics.template_time * 1000
+        match = request.resolver_match
+        name = match.view_name if match else '<unresolved>'
+        similar = metrics.similar(self.n_plus_one)
+
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={db_ms:.1f};desc="{len(metrics.queries)} queries"',
+            f'tpl;dur={template_ms:.1f}',
+            f'total;dur={wall_ms:.1f}',
+        ])
+        request_stats.add(name, wall_ms, len(metrics.queries), db_ms)
+
+        record = {
+            'view': name,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': len(metrics.queries),
+            'duplicate_queries': metrics.duplicates(),
+            'db_ms': round(db_ms, 2),
+            'template_ms': round(template_ms, 2),
+            'wall_ms': round(wall_ms, 2),
+        }
+        if similar:
+            record['similar_queries'] = similar
+        logger.log(logging.WARNING if similar else logging.INFO, json.dumps(record))
+        return response
+
+    def wrap_connections(self, metrics):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(metrics.execute))
+        return stack
+
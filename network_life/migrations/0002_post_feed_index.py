@@ -0,0 +1,17 @@
+# Generated by Django 4.1.5 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_life', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-date_published', '-id'], name='post_feed_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.1.5 on 2026-10-18 19:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_like_count(apps, schema_editor):
+    Post = apps.get_model('network_life', 'Post')
+    PostLike = Post.likes.through
+    Post.objects.update(like_count=Coalesce(Subquery(
+        PostLike.objects.filter(post_id=OuterRef('pk')).values('post_id').annotate(amount=Count('*')).values('amount')
+    ), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_life', '0002_post_feed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_like_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.1.5 on 2026-10-18 19:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_timelines(apps, schema_editor):
+    Post = apps.get_model('network_life', 'Post')
+    Followers = apps.get_model('network_life', 'Followers')
+    TimelineEntry = apps.get_model('network_life', 'TimelineEntry')
+
+    # every author sees their own posts, followers get the latest 50 of each followee
+    followers = {}
+    for user_id, follow_to in Followers.objects.values_list('user_id', 'follow_to').iterator():
+        followers.setdefault(follow_to, set()).add(user_id)
+    for name in Post.objects.values_list('name', flat=True).distinct():
+        posts = Post.objects.filter(name=name).order_by('-date_published', '-id')
+        owners = followers.get(name, set())
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, date_published=date_published)
+             for post_id, author_id, date_published in posts.values_list('id', 'user_id', 'date_published')[:50]
+             for owner_id in owners | {author_id}],
+            batch_size=1000, ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('network_life', '0003_post_like_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date_published', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='network_life.post')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', '-date_published', '-post'], name='timeline_owner_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('owner', 'post'), name='timeline_owner_post_uniq'),
+        ),
+        migrations.RunPython(build_timelines, migrations.RunPython.noop),
+    ]
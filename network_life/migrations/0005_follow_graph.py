@@ -0,0 +1,112 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def usernames_to_ids(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Followers = apps.get_model('network_life', 'Followers')
+
+    last_id = 0
+    while True:
+        rows = list(Followers.objects.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        user_ids = dict(User.objects.filter(username__in={row.follow_to for row in rows}).values_list('username', 'id'))
+        for row in rows:
+            row.followee_id = user_ids.get(row.follow_to)
+        pairs = {(row.follower_id, row.followee_id) for row in rows if row.followee_id is not None}
+        # pairs kept by earlier batches are the rows converted already, looked up for this batch only
+        # so memory stays bounded by BATCH_SIZE
+        seen = pairs & set(Followers.objects.filter(
+            followee__isnull=False, follower_id__in={follower for follower, _ in pairs},
+            followee_id__in={followee for _, followee in pairs},
+        ).values_list('follower_id', 'followee_id'))
+        update, drop = [], []
+        for row in rows:
+            # unknown accounts and duplicate follows can't satisfy the new constraints
+            if row.followee_id is None or (row.follower_id, row.followee_id) in seen:
+                drop.append(row.id)
+            else:
+                seen.add((row.follower_id, row.followee_id))
+                update.append(row)
+        Followers.objects.bulk_update(update, ['followee'])
+        Followers.objects.filter(id__in=drop).delete()
+
+
+def fill_follow_counts(apps, schema_editor):
+    ProfilePage = apps.get_model('network_life', 'ProfilePage')
+    Followers = apps.get_model('network_life', 'Followers')
+
+    def amount(field):
+        return Coalesce(Subquery(
+            Followers.objects.filter(**{f'{field}__username': OuterRef('username')})
+            .values(f'{field}_id').annotate(amount=Count('*')).values('amount')
+        ), Value(0))
+
+    ProfilePage.objects.update(followers_count=amount('followee'), following_count=amount('follower'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('network_life', '0004_timelineentry'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='followers',
+            old_name='user',
+            new_name='follower',
+        ),
+        migrations.AlterField(
+            model_name='followers',
+            name='follower',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='followers',
+            name='followee',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='followers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(usernames_to_ids, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='followers',
+            name='follow_to',
+        ),
+        migrations.RemoveField(
+            model_name='followers',
+            name='username',
+        ),
+        migrations.AlterField(
+            model_name='followers',
+            name='followee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='followers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='followers',
+            constraint=models.UniqueConstraint(fields=('follower', 'followee'), name='followers_pair_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='followers',
+            index=models.Index(fields=['followee', 'follower'], name='followers_followee_idx'),
+        ),
+        migrations.AddField(
+            model_name='profilepage',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profilepage',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_follow_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('taggit', '0005_auto_20220424_2025'),
+        ('network_life', '0005_follow_graph'),
+    ]
+
+    operations = [
+        # lets tag pages read the ids of a tag's posts straight from the index
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS network_life_taggeditem_tag_idx '
+            'ON taggit_taggeditem (tag_id, content_type_id, object_id);',
+            'DROP INDEX IF EXISTS network_life_taggeditem_tag_idx;',
+        ),
+    ]
@@ -0,0 +1,97 @@
+from django.db import migrations
+
+# space separated tag names of post `post_id`
+POST_TAGS = """(
+    SELECT coalesce(group_concat(t.name, ' '), '') FROM taggit_taggeditem ti
+    JOIN taggit_tag t ON t.id = ti.tag_id
+    JOIN django_content_type ct ON ct.id = ti.content_type_id
+    WHERE ti.object_id = {post_id} AND ct.app_label = 'network_life' AND ct.model = 'post'
+)"""
+
+IS_POST = """(
+    SELECT id FROM django_content_type WHERE app_label = 'network_life' AND model = 'post'
+)"""
+
+FORWARD = [
+    # tags weigh twice as much as the description in the ranking
+    "CREATE VIRTUAL TABLE network_life_post_search USING fts5("
+    "description, tags, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "INSERT INTO network_life_post_search (network_life_post_search, rank) VALUES ('rank', 'bm25(1.0, 2.0)')",
+    "CREATE VIRTUAL TABLE network_life_profile_search USING fts5("
+    "username, first_name, second_name, bio, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    "INSERT INTO network_life_profile_search (network_life_profile_search, rank) "
+    "VALUES ('rank', 'bm25(3.0, 2.0, 2.0, 1.0)')",
+
+    # triggers, so bulk_create and raw SQL writes are indexed as well
+    f"""CREATE TRIGGER network_life_post_search_ai AFTER INSERT ON network_life_post BEGIN
+        INSERT INTO network_life_post_search (rowid, description, tags)
+        VALUES (new.id, new.description, {POST_TAGS.format(post_id='new.id')});
+    END""",
+    """CREATE TRIGGER network_life_post_search_au AFTER UPDATE OF description ON network_life_post BEGIN
+        UPDATE network_life_post_search SET description = new.description WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER network_life_post_search_ad AFTER DELETE ON network_life_post BEGIN
+        DELETE FROM network_life_post_search WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER network_life_post_search_tag_ai AFTER INSERT ON taggit_taggeditem
+    WHEN new.content_type_id = {IS_POST} BEGIN
+        UPDATE network_life_post_search SET tags = {POST_TAGS.format(post_id='new.object_id')}
+        WHERE rowid = new.object_id;
+    END""",
+    f"""CREATE TRIGGER network_life_post_search_tag_ad AFTER DELETE ON taggit_taggeditem
+    WHEN old.content_type_id = {IS_POST} BEGIN
+        UPDATE network_life_post_search SET tags = {POST_TAGS.format(post_id='old.object_id')}
+        WHERE rowid = old.object_id;
+    END""",
+    f"""CREATE TRIGGER network_life_post_search_tag_au AFTER UPDATE OF name ON taggit_tag BEGIN
+        UPDATE network_life_post_search SET tags = {POST_TAGS.format(post_id='network_life_post_search.rowid')}
+        WHERE rowid IN (SELECT object_id FROM taggit_taggeditem WHERE tag_id = new.id
+                        AND content_type_id = {IS_POST});
+    END""",
+    """CREATE TRIGGER network_life_profile_search_ai AFTER INSERT ON network_life_profilepage BEGIN
+        INSERT INTO network_life_profile_search (rowid, username, first_name, second_name, bio)
+        VALUES (new.id, new.username, new.first_name, new.second_name, new.bio);
+    END""",
+    """CREATE TRIGGER network_life_profile_search_au AFTER UPDATE ON network_life_profilepage BEGIN
+        UPDATE network_life_profile_search SET username = new.username, first_name = new.first_name,
+            second_name = new.second_name, bio = new.bio
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER network_life_profile_search_ad AFTER DELETE ON network_life_profilepage BEGIN
+        DELETE FROM network_life_profile_search WHERE rowid = old.id;
+    END""",
+
+    # index what already exists
+    f"""INSERT INTO network_life_post_search (rowid, description, tags)
+        SELECT p.id, p.description, {POST_TAGS.format(post_id='p.id')} FROM network_life_post p""",
+    """INSERT INTO network_life_profile_search (rowid, username, first_name, second_name, bio)
+        SELECT id, username, first_name, second_name, bio FROM network_life_profilepage""",
+]
+
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS network_life_post_search_ai',
+    'DROP TRIGGER IF EXISTS network_life_post_search_au',
+    'DROP TRIGGER IF EXISTS network_life_post_search_ad',
+    'DROP TRIGGER IF EXISTS network_life_post_search_tag_ai',
+    'DROP TRIGGER IF EXISTS network_life_post_search_tag_ad',
+    'DROP TRIGGER IF EXISTS network_life_post_search_tag_au',
+    'DROP TRIGGER IF EXISTS network_life_profile_search_ai',
+    'DROP TRIGGER IF EXISTS network_life_profile_search_au',
+    'DROP TRIGGER IF EXISTS network_life_profile_search_ad',
+    'DROP TABLE IF EXISTS network_life_post_search',
+    'DROP TABLE IF EXISTS network_life_profile_search',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('taggit', '0005_auto_20220424_2025'),
+        ('network_life', '0007_outgoingemail'),
+    ]
+
+    operations = [
+        # SQLite FTS5 full-text index of post descriptions and tags and of profiles
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
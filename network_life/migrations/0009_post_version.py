@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_life', '0008_search_index'),
+    ]
+
+    operations = [
+        # a plain ADD COLUMN: SQLite's AddField would copy the whole post table
+        # into a new one, which is slow on large tables and drops the search triggers
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE network_life_post ADD COLUMN version integer unsigned NOT NULL DEFAULT 1 '
+                    'CHECK (version >= 0);',
+                    'ALTER TABLE network_life_post DROP COLUMN version;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='post',
+                    name='version',
+                    field=models.PositiveIntegerField(default=1),
+                ),
+            ],
+        ),
+    ]
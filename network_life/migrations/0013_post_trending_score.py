@@ -0,0 +1,31 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_life', '0012_recommendations'),
+    ]
+
+    operations = [
+        # a plain ADD COLUMN, see 0009_post_version
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    'ALTER TABLE network_life_post ADD COLUMN trending_score real NOT NULL DEFAULT 0;',
+                    'ALTER TABLE network_life_post DROP COLUMN trending_score;',
+                ),
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='post',
+                    name='trending_score',
+                    field=models.FloatField(default=0),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+        ),
+    ]
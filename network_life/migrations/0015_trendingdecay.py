@@ -0,0 +1,20 @@
+# Generated by Django 4.1.5 on 2026-10-18 21:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_life', '0014_outgoingemail_sending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingDecay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('decayed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# the update triggers fire only when a searched column changes, not on every
+# like_count, followers_count or updated_at write
+FORWARD = [
+    'DROP TRIGGER IF EXISTS network_life_post_search_au',
+    """CREATE TRIGGER network_life_post_search_au AFTER UPDATE OF description ON network_life_post
+    WHEN old.description IS NOT new.description BEGIN
+        UPDATE network_life_post_search SET description = new.description WHERE rowid = new.id;
+    END""",
+    'DROP TRIGGER IF EXISTS network_life_profile_search_au',
+    """CREATE TRIGGER network_life_profile_search_au
+    AFTER UPDATE OF username, first_name, second_name, bio ON network_life_profilepage
+    WHEN old.username IS NOT new.username OR old.first_name IS NOT new.first_name
+        OR old.second_name IS NOT new.second_name OR old.bio IS NOT new.bio BEGIN
+        UPDATE network_life_profile_search SET username = new.username, first_name = new.first_name,
+            second_name = new.second_name, bio = new.bio
+        WHERE rowid = new.id;
+    END""",
+]
+
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS network_life_post_search_au',
+    """CREATE TRIGGER network_life_post_search_au AFTER UPDATE OF description ON network_life_post BEGIN
+        UPDATE network_life_post_search SET description = new.description WHERE rowid = new.id;
+    END""",
+    'DROP TRIGGER IF EXISTS network_life_profile_search_au',
+    """CREATE TRIGGER network_life_profile_search_au AFTER UPDATE ON network_life_profilepage BEGIN
+        UPDATE network_life_profile_search SET username = new.username, first_name = new.first_name,
+            second_name = new.second_name, bio = new.bio
+        WHERE rowid = new.id;
+    END""",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('network_life', '0015_trendingdecay'),
+    ]
+
+    operations = [
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
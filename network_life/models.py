@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 import datetime
 from cloudinary.models import CloudinaryField
@@ -10,6 +11,9 @@ class ProfilePage(models.Model):
     second_name = models.CharField(max_length=50, default='', null=True)
     username = models.CharField(max_length=50, unique=True)
     bio = models.TextField(default='', null=True)
+    # kept in sync by network_life.follows.toggle_follow
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
     register_date = models.DateTimeField(default=datetime.datetime.now(), null=True)
     avatar = CloudinaryField('avatar',
                              transformation={'radius': '50', "width": "32", "quality": "auto", "crop": "scale",
@@ -17,6 +21,18 @@ class ProfilePage(models.Model):
                              folder='/NetworkLife*/avatars')
 
 
+class PostQuerySet(models.QuerySet):
+    def with_card_data(self):
+        # the author of every card in the same query; tags are prefetched by
+        # network_life.fragments, only for the cards missing from the cache
+        return self.select_related('user')
+
+    def touch(self, **updates):
+        # update() for changes a post card shows: bumps the card version (cache key,
+        # ETag) and updated_at (Last-Modified) in the same statement
+        return self.update(version=models.F('version') + 1, updated_at=timezone.now(), **updates)
+
+
 class Post(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     main_image = CloudinaryField('main_image', folder='/NetworkLife*/images')
@@ -24,11 +40,40 @@ class Post(models.Model):
                               folder='/NetworkLife*/preview')
     description = models.TextField()
     likes = models.ManyToManyField(User, related_name='post_likes')
+    # denormalized len(likes), kept in sync by network_life.likes.toggle_like
+    like_count = models.PositiveIntegerField(default=0)
+    # bumped on every change shown on the post card (PostQuerySet.touch), part of its fragment cache key
+    version = models.PositiveIntegerField(default=1)
+    # last change of anything the card shows, None means unchanged since date_published
+    updated_at = models.DateTimeField(null=True, blank=True)
+    # likes decayed by age, changed with like_count and decayed by network_life.trending.decay
+    trending_score = models.FloatField(default=0)
     name = models.CharField(max_length=100)
     date_published = models.DateTimeField(default=datetime.datetime.now())
 
     tags = TaggableManager()
 
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-date_published', '-id'], name='post_feed_idx'),
+            models.Index(fields=['updated_at'], name='post_updated_idx'),
+            models.Index(fields=['-trending_score', '-id'], name='post_trending_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # an edit changes the card; the version is bumped in SQL, so saving an
+        # instance loaded before a like can't write an already used version back
+        if not self._state.adding:
+            self.version = models.F('version') + 1
+            self.updated_at = timezone.now()
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'updated_at'}
+        super().save(*args, **kwargs)
+        if not isinstance(self.version, int):
+            self.refresh_from_db(fields=['version'])
+
 
 class Image(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images')
@@ -37,9 +82,89 @@ class Image(models.Model):
 
 
 class Followers(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    follow_to = models.CharField(max_length=100)
-    username = models.CharField(max_length=100)
+    follower = models.ForeignKey(User, on_delete=models.CASCADE, related_name='following')
+    followee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='followers')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'], name='followers_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['followee', 'follower'], name='followers_followee_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.follower} -> {self.followee}'
+
+
+class Recommendation(models.Model):
+    # an account user may want to follow, computed by network_life.recommendations
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # how many of the accounts user follows follow candidate
+    mutual = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'], name='recommendation_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-mutual'], name='recommendation_user_idx'),
+        ]
+
+
+class StaleRecommendation(models.Model):
+    # a user whose follows changed since the last refresh_recommendations run
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+
+
+class TrendingDecay(models.Model):
+    # a single row: when network_life.trending.decay_since_last_pass last decayed the trending scores
+    decayed_at = models.DateTimeField()
+
+
+class TimelineEntry(models.Model):
+    # a post pushed into the "following" timeline of owner (fan-out on write)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    date_published = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'post'], name='timeline_owner_post_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['owner', '-date_published', '-post'], name='timeline_owner_idx'),
+            models.Index(fields=['owner', 'author'], name='timeline_owner_author_idx'),
+        ]
+
+
+class OutgoingEmail(models.Model):
+    # e-mail waiting in the outbox for the send_outbox worker
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUSES = [(PENDING, 'Pending'), (SENDING, 'Sending'), (SENT, 'Sent'), (FAILED, 'Failed')]
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255, null=True)
+    to = models.JSONField(default=list)
+    alternatives = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(default='')
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
 
     def __str__(self):
-        return self.username
+        return f'{self.subject} -> {", ".join(self.to)}'
@@ -0,0 +1,97 @@
+import datetime
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutgoingEmail
+
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_RETRY_DELAY = 60
+DEFAULT_CLAIM_TIMEOUT = 300
+
+
+def queue_email(email):
+    """Store an EmailMultiAlternatives in the outbox instead of sending it in the request."""
+    return OutgoingEmail.objects.create(
+        subject=email.subject,
+        body=email.body,
+        from_email=email.from_email,
+        to=list(email.to),
+        alternatives=[list(alternative) for alternative in email.alternatives],
+    )
+
+
+def build_message(outgoing, connection):
+    email = EmailMultiAlternatives(outgoing.subject, outgoing.body, outgoing.from_email, outgoing.to,
+                                   connection=connection)
+    for content, mimetype in outgoing.alternatives:
+        email.attach_alternative(content, mimetype)
+    return email
+
+
+def claim(outgoing, timeout):
+    """
+    Mark a due e-mail as being sent by this worker, False if another worker
+    claimed it first. A claim older than timeout seconds belongs to a worker
+    that died while sending, and can be taken over.
+    """
+    claimed = OutgoingEmail.objects.filter(pk=outgoing.pk, status=outgoing.status, attempts=outgoing.attempts).update(
+        status=OutgoingEmail.SENDING, attempts=F('attempts') + 1,
+        next_attempt_at=timezone.now() + datetime.timedelta(seconds=timeout))
+    if not claimed:
+        return False
+    outgoing.attempts += 1
+    return True
+
+
+def send_queued(batch_size=100, max_attempts=None, retry_delay=None):
+    """
+    Send one batch of due e-mails over a single SMTP connection.
+
+    Every e-mail is claimed right before it is sent, so workers running at
+    the same time never send one twice. A failed message is retried with
+    exponential backoff (retry_delay, 2x, 4x, ... seconds) and given up
+    after max_attempts. Returns (sent, failed).
+    """
+    max_attempts = max_attempts or getattr(settings, 'OUTBOX_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)
+    retry_delay = retry_delay or getattr(settings, 'OUTBOX_RETRY_DELAY', DEFAULT_RETRY_DELAY)
+    claim_timeout = getattr(settings, 'OUTBOX_CLAIM_TIMEOUT', DEFAULT_CLAIM_TIMEOUT)
+
+    due = list(OutgoingEmail.objects.filter(status__in=[OutgoingEmail.PENDING, OutgoingEmail.SENDING],
+                                            next_attempt_at__lte=timezone.now())
+               .order_by('next_attempt_at', 'id')[:batch_size])
+    if not due:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection()
+    try:
+        try:
+            connection.open()
+        except Exception:
+            # each send below retries the connection and records the error on its message
+            pass
+        for outgoing in due:
+            if not claim(outgoing, claim_timeout):
+                continue
+            try:
+                build_message(outgoing, connection).send()
+            except Exception as e:
+                failed += 1
+                outgoing.last_error = repr(e)
+                if outgoing.attempts >= max_attempts:
+                    outgoing.status = OutgoingEmail.FAILED
+                else:
+                    outgoing.status = OutgoingEmail.PENDING
+                    delay = retry_delay * 2 ** (outgoing.attempts - 1)
+                    outgoing.next_attempt_at = timezone.now() + datetime.timedelta(seconds=delay)
+            else:
+                sent += 1
+                outgoing.status = OutgoingEmail.SENT
+                outgoing.sent_at = timezone.now()
+            outgoing.save(update_fields=['attempts', 'status', 'last_error', 'next_attempt_at', 'sent_at'])
+    finally:
+        connection.close()
+    return sent, failed
@@ -0,0 +1,66 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(date_published, post_id):
+    # cursor points at the last post of the page: "<date_published>|<id>"
+    raw = f'{date_published.isoformat()}|{post_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (date_published, id) for a cursor or None if it can't be parsed."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_published, post_id = raw.rsplit('|', 1)
+        date_published = parse_datetime(date_published)
+        post_id = int(post_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if date_published is None:
+        return None
+    return date_published, post_id
+
+
+def get_page_size(request):
+    default = getattr(settings, 'FEED_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    maximum = getattr(settings, 'FEED_MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    try:
+        page_size = int(request.GET.get('page_size', default))
+    except ValueError:
+        page_size = default
+    return max(1, min(page_size, maximum))
+
+
+def paginate_posts(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, id_field='id'):
+    """
+    Keyset pagination over posts ordered by (date_published, id) descending.
+
+    Only page_size + 1 rows are fetched, so the cost of a page does not depend
+    on how many posts exist. id_field names the post id column for querysets
+    of rows that point at posts (e.g. timeline entries). Returns
+    (rows, next_cursor); next_cursor is None on the last page.
+    """
+    queryset = queryset.order_by('-date_published', f'-{id_field}')
+    position = decode_cursor(cursor)
+    if position is not None:
+        date_published, post_id = position
+        queryset = queryset.filter(
+            Q(date_published__lt=date_published) | Q(date_published=date_published, **{f'{id_field}__lt': post_id})
+        )
+
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(rows[-1].date_published, getattr(rows[-1], id_field))
+    return rows, next_cursor
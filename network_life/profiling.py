@@ -0,0 +1,187 @@
+import cProfile
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+DEFAULT_MAX_REPORTS = 50
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+REPORT_NAME = re.compile(r'[\w.-]+')
+# stacks carrying less of the total time are left out of the collapsed export
+MIN_STACK_SHARE = 0.0005
+
+
+def profile_root():
+    return str(getattr(settings, 'PROFILE_ROOT', os.path.join(settings.BASE_DIR, 'profiles')))
+
+
+class ProfileStore:
+    """
+    Profiler reports on disk, a ring buffer: once there are more than
+    PROFILE_MAX_REPORTS reports or they take more than PROFILE_MAX_BYTES,
+    the oldest are deleted. Every report is a pstats dump (<name>.prof) and
+    its metadata (<name>.json); names start with the time in milliseconds,
+    so they sort oldest first.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def save(self, profiler, meta):
+        os.makedirs(self.root, exist_ok=True)
+        view = re.sub(r'[^\w.-]', '_', meta['view'])
+        name = f'{int(meta["timestamp"] * 1000)}-{view}-{uuid.uuid4().hex[:8]}'
+        profiler.dump_stats(os.path.join(self.root, f'{name}.prof'))
+        with open(os.path.join(self.root, f'{name}.json'), 'w') as file:
+            json.dump({**meta, 'name': name}, file)
+        self.prune()
+        return name
+
+    def names(self):
+        try:
+            files = os.listdir(self.root)
+        except FileNotFoundError:
+            return []
+        return sorted(file[:-5] for file in files if file.endswith('.prof'))
+
+    def prune(self):
+        max_reports = getattr(settings, 'PROFILE_MAX_REPORTS', DEFAULT_MAX_REPORTS)
+        max_bytes = getattr(settings, 'PROFILE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        names = self.names()
+        sizes = {name: sum(self.size(self.path(name, extension)) for extension in ('prof', 'json')) for name in names}
+        total = sum(sizes.values())
+        while names and (len(names) > max_reports or total > max_bytes):
+            name = names.pop(0)
+            total -= sizes[name]
+            for extension in ('prof', 'json'):
+                try:
+                    os.remove(self.path(name, extension))
+                except FileNotFoundError:
+                    # pruned by another process at the same time
+                    pass
+
+    @staticmethod
+    def size(path):
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def path(self, name, extension='prof'):
+        # fullmatch, `$` would also accept a name ending in a newline
+        if not REPORT_NAME.fullmatch(name):
+            raise FileNotFoundError(name)
+        return os.path.join(self.root, f'{name}.{extension}')
+
+    def meta(self, name):
+        with open(self.path(name, 'json')) as file:
+            return json.load(file)
+
+    def reports(self):
+        """Metadata of every stored report, newest first."""
+        reports = []
+        for name in reversed(self.names()):
+            try:
+                reports.append(self.meta(name))
+            except (FileNotFoundError, ValueError):
+                continue
+        return reports
+
+    def stats(self, name, stream=None):
+        return pstats.Stats(self.path(name), stream=stream)
+
+
+def frame_label(function):
+    filename, line, name = function
+    if filename == '~':
+        # built-in functions
+        label = name
+    else:
+        label = f'{name} ({os.path.basename(filename)}:{line})'
+    return label.replace(';', ',')
+
+
+def collapsed_stacks(stats):
+    """
+    The profile in the collapsed stack format of flamegraph.pl, speedscope
+    and inferno: "root;caller;function microseconds" per line.
+
+    cProfile only records caller -> callee edges, so a function's time is
+    split between the stacks it was called from in proportion to the time
+    spent in each call edge, an approximation for functions called from
+    several places.
+    """
+    entries = stats.stats
+    children = defaultdict(list)
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, edge_time) in callers.items():
+            children[caller].append((function, edge_time))
+    roots = [function for function, entry in entries.items() if not entry[4]]
+    total = sum(entries[root][3] for root in roots) or 1
+    folded = defaultdict(float)
+
+    def walk(function, path, weight):
+        _, _, own_time, cumulative_time, _ = entries[function]
+        if weight < total * MIN_STACK_SHARE or cumulative_time <= 0 or len(path) > 100:
+            return
+        path = path + (frame_label(function),)
+        folded[';'.join(path)] += weight * own_time / cumulative_time
+        on_path = set(path)
+        for child, edge_time in children[function]:
+            # recursion is folded into the outermost call
+            if frame_label(child) not in on_path:
+                walk(child, path, weight * edge_time / cumulative_time)
+
+    for root in roots:
+        walk(root, (), entries[root][3])
+    return ''.join(f'{stack} {round(seconds * 1e6)}\n' for stack, seconds in folded.items()
+                   if round(seconds * 1e6) > 0)
+
+
+def wants_profile(request):
+    return request.GET.get('profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+class RequestProfilerMiddleware:
+    """
+    Runs a request under cProfile when a staff user asks for it with
+    ?profile=1 or an X-Profile: 1 header, and stores the report in the
+    ProfileStore. The response names it in an X-Profile-Report header.
+    Off unless REQUEST_PROFILER is set, nothing is measured for any other
+    request when it is.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILER', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not (wants_profile(request) and request.user.is_staff):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        match = request.resolver_match
+        name = ProfileStore(profile_root()).save(profiler, {
+            'view': match.view_name if match else '<unresolved>',
+            'path': request.get_full_path(),
+            'method': request.method,
+            'status': response.status_code,
+            'user': request.user.username,
+            'timestamp': time.time(),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+        })
+        response['X-Profile-Report'] = name
+        return response
@@ -0,0 +1,161 @@
+import itertools
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from scipy import sparse
+
+from .models import Followers, Recommendation, StaleRecommendation
+
+DEFAULT_PER_USER = 20
+DEFAULT_SHOWN = 5
+DEFAULT_BATCH_SIZE = 1000
+# ids per IN (...) list, below SQLite's bound parameter limit
+CHUNK_SIZE = 500
+
+
+def chunks(values, size=CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class FollowGraph:
+    """
+    Who follows whom as a sparse adjacency matrix in CSR form:
+    adjacency[i, j] is 1 when the user ids[i] follows the user ids[j].
+
+    Friends of friends of a batch of users are one sparse product,
+    adjacency[rows] @ adjacency: entry (r, j) counts the accounts the r-th
+    user of the batch follows that follow ids[j].
+    """
+
+    def __init__(self, followers, followees):
+        # followers[k] follows followees[k], int64 arrays of user ids
+        self.ids = np.unique(np.concatenate([followers, followees]))
+        size = len(self.ids)
+        self.adjacency = sparse.csr_matrix(
+            (np.ones(len(followers), dtype=np.int32),
+             (np.searchsorted(self.ids, followers), np.searchsorted(self.ids, followees))),
+            shape=(size, size))
+
+    @classmethod
+    def load(cls):
+        # one scan of the followers_pair_uniq index, straight into an int64 array
+        edges = Followers.objects.order_by('follower_id', 'followee_id').values_list('follower_id', 'followee_id')
+        pairs = np.fromiter(itertools.chain.from_iterable(edges.iterator(chunk_size=10000)), dtype=np.int64)
+        pairs = pairs.reshape(-1, 2)
+        return cls(pairs[:, 0], pairs[:, 1])
+
+    def followers(self):
+        """Ids of the users who follow someone."""
+        return self.ids[np.diff(self.adjacency.indptr) > 0].tolist()
+
+    def rows(self, user_ids):
+        # (user ids in the graph, their row numbers)
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.ids, user_ids), max(len(self.ids) - 1, 0))
+        known = self.ids[rows] == user_ids if len(self.ids) else np.zeros(len(user_ids), dtype=bool)
+        return user_ids[known], rows[known]
+
+    def recommend_batch(self, user_ids, size):
+        """
+        {user_id: [(candidate_id, mutual)]} with the size accounts followed by
+        the most accounts each user follows, that the user doesn't follow yet.
+        Ties go to the lower id. Users without candidates are left out.
+        """
+        user_ids, rows = self.rows(user_ids)
+        followed = self.adjacency[rows]
+        mutual = (followed @ self.adjacency).tocsr()
+        # the user and the accounts they already follow are no candidates
+        known = followed + sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), (np.arange(len(rows)), rows)),
+                                             shape=followed.shape)
+        known.data[:] = 1
+        mutual = (mutual - mutual.multiply(known)).tocsr()
+        mutual.eliminate_zeros()
+
+        recommendations = {}
+        for user_id, start, end in zip(user_ids.tolist(), mutual.indptr[:-1], mutual.indptr[1:]):
+            if start == end:
+                continue
+            counts, candidates = mutual.data[start:end], self.ids[mutual.indices[start:end]]
+            best = np.lexsort((candidates, -counts))[:size]
+            recommendations[user_id] = list(zip(candidates[best].tolist(), counts[best].tolist()))
+        return recommendations
+
+    def recommend(self, user_id, size):
+        return self.recommend_batch([user_id], size).get(user_id, [])
+
+
+def affected_users(stale):
+    # a changed follow changes the recommendations of the user and of everyone following them
+    users = set(stale)
+    for chunk in chunks(stale):
+        users.update(Followers.objects.filter(followee_id__in=chunk).values_list('follower_id', flat=True))
+    return users
+
+
+def insert_recommendations(rows):
+    # a plain executemany, building a model instance per row costs more than computing the rows
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(column) for column in ('user_id', 'candidate_id', 'mutual', 'computed_at'))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(Recommendation._meta.db_table)} ({columns}) '
+                           f'VALUES (%s, %s, %s, %s)', rows)
+
+
+def refresh_recommendations(incremental=False, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Recompute the stored recommendations, returns (users, rows written).
+
+    The whole follow graph is loaded once either way. A full run covers
+    every user who follows someone; an incremental run only the users whose
+    follows changed since the last run (StaleRecommendation) and their
+    followers. Every batch_size users are one sparse product and one
+    transaction replacing their results.
+    """
+    started = timezone.now()
+    per_user = getattr(settings, 'RECOMMENDATIONS_PER_USER', DEFAULT_PER_USER)
+
+    # claimed before the graph is read: a follow made during the run marks its user again
+    with transaction.atomic():
+        stale = list(StaleRecommendation.objects.values_list('user_id', flat=True))
+        for chunk in chunks(stale):
+            StaleRecommendation.objects.filter(user_id__in=chunk).delete()
+
+    try:
+        graph = FollowGraph.load()
+        users = sorted(affected_users(stale) if incremental else graph.followers())
+        rows = 0
+        computed_at = connection.ops.adapt_datetimefield_value(started)
+        for batch in chunks(users, batch_size):
+            results = graph.recommend_batch(batch, per_user)
+            recommendations = [(user_id, candidate_id, mutual, computed_at)
+                               for user_id in batch for candidate_id, mutual in results.get(user_id, ())]
+            with transaction.atomic():
+                for chunk in chunks(batch):
+                    Recommendation.objects.filter(user_id__in=chunk).delete()
+                insert_recommendations(recommendations)
+            rows += len(recommendations)
+        if not incremental:
+            # users who stopped following everyone
+            Recommendation.objects.filter(computed_at__lt=started).delete()
+    except Exception:
+        StaleRecommendation.objects.bulk_create([StaleRecommendation(user_id=user_id) for user_id in stale],
+                                                ignore_conflicts=True)
+        raise
+    return len(users), rows
+
+
+def mark_stale(user):
+    StaleRecommendation.objects.bulk_create([StaleRecommendation(user=user)], ignore_conflicts=True)
+
+
+def recommended_accounts(user):
+    """[{'username', 'mutual'}] to show user, best first, without accounts followed since the last run."""
+    followed = Followers.objects.filter(follower_id=user.pk).values('followee_id')
+    return list(Recommendation.objects.filter(user_id=user.pk).exclude(candidate_id__in=followed)
+                .order_by('-mutual', 'candidate_id')
+                .values('mutual', username=F('candidate__username'))[:getattr(settings, 'RECOMMENDATIONS_SHOWN', DEFAULT_SHOWN)])
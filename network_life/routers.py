@@ -0,0 +1,104 @@
+import contextvars
+import random
+import sqlite3
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+DEFAULT_STICKY_SECONDS = 5
+STICKY_COOKIE = 'pin_primary'
+
+# {'replica_reads': bool, 'wrote': bool} for a network_life request, None everywhere else
+_request = contextvars.ContextVar('db_request', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary ("default"). Reads of network_life views go to a
+    random DATABASE_REPLICAS alias, unless the request already wrote, runs in
+    a transaction or is pinned to the primary after a recent write (see
+    ReplicaPinMiddleware). Sessions and everything outside such requests,
+    management commands included, are read from the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        if (state is None or not state['replica_reads'] or state['wrote'] or not replicas()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block
+                # a session missing from a lagging replica would log the user out
+                or model._meta.app_label == 'sessions'):
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            # read your own writes for the rest of the request
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get the schema with the data, from copy_database
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaPinMiddleware:
+    """
+    Enables replica reads for network_life views. A request that writes sets
+    a short-lived cookie, and the same browser reads from the primary until it
+    expires (REPLICA_STICKY_SECONDS, the replication lag budget), so a user
+    always sees their own likes and follows.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'replica_reads': False, 'wrote': False}
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        if state['wrote'] and replicas():
+            response.set_cookie(STICKY_COOKIE, '1', httponly=True, samesite='Lax',
+                                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _request.get()
+        if state is not None:
+            # POST views read what they are about to change, those reads stay on the primary
+            state['replica_reads'] = (request.method in ('GET', 'HEAD')
+                                      and view_func.__module__.startswith('network_life.')
+                                      and STICKY_COOKIE not in request.COOKIES)
+
+
+def copy_database(source, target):
+    """
+    Copy the SQLite database file source over target with the backup API, a
+    consistent snapshot even while source is being written. Stands in for
+    replication when running with local replica files.
+    """
+    src, dst = sqlite3.connect(source), sqlite3.connect(target)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def sync_replicas():
+    """Copy the primary over every replica, returns the synced aliases."""
+    source = connections[DEFAULT_DB_ALIAS].settings_dict['NAME']
+    for alias in replicas():
+        copy_database(source, connections[alias].settings_dict['NAME'])
+    return replicas()
@@ -0,0 +1,87 @@
+import re
+
+from django.conf import settings
+from django.db import connection, connections, router, transaction
+
+from .models import ProfilePage, Post
+
+# Kept in sync by triggers on the post, profile and taggit tables (0008 migration).
+# A migration that makes SQLite rebuild one of those tables drops its triggers.
+POST_TABLE = 'network_life_post_search'
+PROFILE_TABLE = 'network_life_profile_search'
+DEFAULT_CANDIDATES = 1000
+
+
+def match_query(text):
+    """
+    FTS5 MATCH expression for user input: every word must match, the words
+    are matched as prefixes ("trav" finds "travelling"). Operators and quotes
+    in the input are dropped, so no input is a syntax error. Returns None
+    when there is nothing to search for.
+    """
+    words = re.findall(r'\w+', text)
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words[:16])
+
+
+def _match_ids(table, query, limit, offset=0):
+    # bm25 costs a few microseconds per matching row, so only the newest
+    # SEARCH_CANDIDATES matches are ranked: a common word matches a large part
+    # of the table and ranking all of it would cost tens of milliseconds
+    candidates = getattr(settings, 'SEARCH_CANDIDATES', DEFAULT_CANDIDATES)
+    limit = max(0, min(limit, candidates - offset))
+    with connections[router.db_for_read(Post)].cursor() as cursor:
+        # rank is bm25 with the column weights configured in the 0008 migration
+        cursor.execute(f'SELECT rowid FROM (SELECT rowid, rank FROM {table} WHERE {table} MATCH %s '
+                       f'ORDER BY rowid DESC LIMIT %s) ORDER BY rank, rowid DESC LIMIT %s OFFSET %s',
+                       [query, candidates, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_posts(text, page=1, page_size=20):
+    """
+    Posts matching text by description or tags, best match first among the
+    newest SEARCH_CANDIDATES matches. Returns (posts, next_page).
+    """
+    query = match_query(text)
+    if query is None:
+        return [], None
+    ids = _match_ids(POST_TABLE, query, page_size + 1, (page - 1) * page_size)
+    next_page = page + 1 if len(ids) > page_size else None
+    ids = ids[:page_size]
+    posts = Post.objects.with_card_data().in_bulk(ids)
+    return [posts[post_id] for post_id in ids if post_id in posts], next_page
+
+
+def search_profiles(text, limit=5):
+    """Profiles matching text by username, names or bio, best match first."""
+    query = match_query(text)
+    if query is None:
+        return []
+    ids = _match_ids(PROFILE_TABLE, query, limit)
+    profiles = ProfilePage.objects.in_bulk(ids)
+    return [profiles[profile_id] for profile_id in ids if profile_id in profiles]
+
+
+def rebuild_index():
+    """Re-index every post and profile from scratch, returns (posts, profiles) indexed."""
+    tags = """(
+        SELECT coalesce(group_concat(t.name, ' '), '') FROM taggit_taggeditem ti
+        JOIN taggit_tag t ON t.id = ti.tag_id
+        JOIN django_content_type ct ON ct.id = ti.content_type_id
+        WHERE ti.object_id = p.id AND ct.app_label = 'network_life' AND ct.model = 'post'
+    )"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE}')
+        cursor.execute(f'INSERT INTO {POST_TABLE} (rowid, description, tags) '
+                       f'SELECT p.id, p.description, {tags} FROM network_life_post p')
+        posts = cursor.rowcount
+        cursor.execute(f'DELETE FROM {PROFILE_TABLE}')
+        cursor.execute(f'INSERT INTO {PROFILE_TABLE} (rowid, username, first_name, second_name, bio) '
+                       f'SELECT id, username, first_name, second_name, bio FROM network_life_profilepage')
+        profiles = cursor.rowcount
+        # merge the index segments, keeps queries fast after large rebuilds
+        cursor.execute(f"INSERT INTO {POST_TABLE} ({POST_TABLE}) VALUES ('optimize')")
+        cursor.execute(f"INSERT INTO {PROFILE_TABLE} ({PROFILE_TABLE}) VALUES ('optimize')")
+    return posts, profiles
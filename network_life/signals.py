@@ -0,0 +1,14 @@
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from taggit.models import TaggedItem
+
+from .fragments import bump_version
+from .models import Post
+
+
+@receiver(m2m_changed, sender=TaggedItem)
+def post_tags_changed(sender, instance, action, **kwargs):
+    # taggit writes TaggedItem rows directly, Post.save doesn't run; a new
+    # version makes the cached card and post page of the old one unreachable
+    if isinstance(instance, Post) and action in ('post_add', 'post_remove', 'post_clear'):
+        bump_version(instance.pk)
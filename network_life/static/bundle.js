@@ -15,7 +15,7 @@
   \*********************************/
 /***/ (() => {
 
-eval("$( document ).ready(function() {\r\n\r\n    $('#like-form').submit(function(e){\r\n        e.preventDefault()\r\n\r\n        const post_id = $(this).attr('elementID')\r\n        const url = $(this).attr('action')\r\n\r\n        $.ajax({\r\n            type: 'POST',\r\n            url: url,\r\n            data: {\r\n                'csrfmiddlewaretoken': $('input[name=csrfmiddlewaretoken]').val(),\r\n                'post_id':post_id,\r\n            },\r\n            dataType: 'json',\r\n            success: function(response) {\r\n                $(`#likes_count${post_id}`).text(response['amount_likes'])\r\n            },\r\n\r\n            error: function(response) {\r\n                alert('An error has occurred while liking a post!')\r\n            }\r\n        })\r\n\r\n    })\r\n});\r\n\n\n//# sourceURL=webpack://task-14---add-a-little-look/./assets/scripts/index.js?");
+eval("$( document ).ready(function() {\r\n\r\n    // clicks wait LIKE_DELAY ms for more clicks, then all cards' likes go out in one request\r\n    const LIKE_DELAY = 400\r\n    // post id -> liked state the server last confirmed, for posts clicked since the last batch\r\n    const likesConfirmed = {}\r\n    let likesTimer = null\r\n    let likesSending = false\r\n\r\n    function likeForms(post_id) {\r\n        // a post can be on the page more than once\r\n        return $(`.like-form[data-post-id=${post_id}]`)\r\n    }\r\n\r\n    function likeCount(post_id) {\r\n        return parseInt(likeForms(post_id).first().find('.likes-count').text())\r\n    }\r\n\r\n    function showLike(post_id, liked, like_count) {\r\n        const forms = likeForms(post_id)\r\n        forms.data('liked', liked)\r\n        forms.find('button').toggleClass('btn-danger', !liked).toggleClass('btn-outline-danger', liked)\r\n            .text(liked ? 'Liked 👍' : 'Like 👍')\r\n        forms.find('.likes-count').text(like_count)\r\n    }\r\n\r\n    function sendLikes() {\r\n        likesTimer = null\r\n        if (likesSending) {\r\n            // one batch at a time, clicks made meanwhile go out in the next one\r\n            likesTimer = setTimeout(sendLikes, LIKE_DELAY)\r\n            return\r\n        }\r\n        // only the final state of every post is sent, clicks that ended where they started are dropped\r\n        const likes = {}\r\n        const before = {}\r\n        let url = null\r\n        for (const post_id of Object.keys(likesConfirmed)) {\r\n            const form = likeForms(post_id)\r\n            if (form.data('liked') !== likesConfirmed[post_id]) {\r\n                likes[post_id] = form.data('liked')\r\n                before[post_id] = likesConfirmed[post_id]\r\n                url = form.data('batch-url')\r\n            }\r\n            delete likesConfirmed[post_id]\r\n        }\r\n        if (url === null) {\r\n            return\r\n        }\r\n\r\n        likesSending = true\r\n        $.ajax({\r\n            type: 'POST',\r\n            url: url,\r\n            data: JSON.stringify({'likes': likes}),\r\n            contentType: 'application/json',\r\n            headers: {'X-CSRFToken': $('input[name=csrfmiddlewaretoken]').val()},\r\n            dataType: 'json',\r\n            success: function(response) {\r\n                for (const [post_id, post] of Object.entries(response['posts'])) {\r\n                    let liked = post['liked']\r\n                    if (post_id in likesConfirmed) {\r\n                        // clicked again while the batch was on its way, keep what the user sees\r\n                        likesConfirmed[post_id] = post['liked']\r\n                        liked = likeForms(post_id).data('liked')\r\n                    }\r\n                    showLike(post_id, liked, post['like_count'] + (liked === post['liked'] ? 0 : (liked ? 1 : -1)))\r\n                }\r\n            },\r\n\r\n            error: function(response) {\r\n                for (const post_id of Object.keys(before)) {\r\n                    if (!(post_id in likesConfirmed)) {\r\n                        const like_count = likeCount(post_id)\r\n                        showLike(post_id, before[post_id], like_count + (before[post_id] ? 1 : -1))\r\n                    }\r\n                }\r\n                alert('An error has occurred while liking a post!')\r\n            },\r\n\r\n            complete: function() {\r\n                likesSending = false\r\n            }\r\n        })\r\n    }\r\n\r\n    // delegated, so cards appended by \"load more\" are handled too\r\n    $(document).on('submit', '.like-form', function(e){\r\n        e.preventDefault()\r\n\r\n        const form = $(this)\r\n        const post_id = form.data('post-id')\r\n        const liked = form.data('liked')\r\n        if (!(post_id in likesConfirmed)) {\r\n            likesConfirmed[post_id] = liked\r\n        }\r\n        // shown right away, the server's count replaces it when the batch is answered\r\n        const like_count = likeCount(post_id) + (liked ? -1 : 1)\r\n        showLike(post_id, !liked, like_count)\r\n\r\n        clearTimeout(likesTimer)\r\n        likesTimer = setTimeout(sendLikes, LIKE_DELAY)\r\n    })\r\n\r\n    // like counts of the cards on screen, pushed by the server\r\n    let likesStream = null\r\n\r\n    function watchLikes() {\r\n        const feed = $('#feed')\r\n        if (!window.EventSource || !feed.length) {\r\n            return\r\n        }\r\n        if (likesStream) {\r\n            likesStream.close()\r\n        }\r\n        const post_ids = $.map(feed.find('.like-form'), form => $(form).data('post-id'))\r\n        if (!post_ids.length) {\r\n            return\r\n        }\r\n        likesStream = new EventSource(`${feed.data('live-url')}?posts=${post_ids.join(',')}`)\r\n        likesStream.addEventListener('likes', function(e) {\r\n            for (const [post_id, like_count] of Object.entries(JSON.parse(e.data))) {\r\n                // the user's own clicks on their way to the server win\r\n                if (!(post_id in likesConfirmed) && !likesSending) {\r\n                    likeForms(post_id).find('.likes-count').text(like_count)\r\n                }\r\n            }\r\n        })\r\n    }\r\n\r\n    watchLikes()\r\n\r\n    $('#load-more').click(function(){\r\n        const button = $(this)\r\n\r\n        $.ajax({\r\n            type: 'GET',\r\n            url: button.data('url'),\r\n            data: {'cursor': button.data('cursor')},\r\n            dataType: 'json',\r\n            success: function(response) {\r\n                $('#feed').append(response['html'])\r\n                watchLikes()\r\n                if (response['next_cursor']) {\r\n                    button.data('cursor', response['next_cursor'])\r\n                } else {\r\n                    button.remove()\r\n                }\r\n            },\r\n\r\n            error: function(response) {\r\n                alert('An error has occurred while loading posts!')\r\n            }\r\n        })\r\n    })\r\n});\r\n\n\n//# sourceURL=webpack://task-14---add-a-little-look/./assets/scripts/index.js?");
 
 /***/ })
 
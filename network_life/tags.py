@@ -0,0 +1,38 @@
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Count
+from taggit.models import Tag, TaggedItem
+
+from .models import Post
+
+TAG_INDEX_CACHE_KEY = 'network_life:tag_index'
+DEFAULT_TAG_INDEX_SIZE = 30
+DEFAULT_TAG_INDEX_TIMEOUT = 600
+
+
+def tag_index():
+    """Most used post tags as [{'name', 'slug', 'amount'}], cached."""
+    index = cache.get(TAG_INDEX_CACHE_KEY)
+    if index is None:
+        size = getattr(settings, 'TAG_INDEX_SIZE', DEFAULT_TAG_INDEX_SIZE)
+        index = list(
+            Tag.objects.filter(taggit_taggeditem_items__content_type=ContentType.objects.get_for_model(Post))
+            # a tag of symbols only has an empty slug and no feed
+            .exclude(slug='')
+            .annotate(amount=Count('taggit_taggeditem_items'))
+            .order_by('-amount', 'name')
+            .values('name', 'slug', 'amount')[:size]
+        )
+        cache.set(TAG_INDEX_CACHE_KEY, index, getattr(settings, 'TAG_INDEX_TIMEOUT', DEFAULT_TAG_INDEX_TIMEOUT))
+    return index
+
+
+def invalidate_tag_index():
+    cache.delete(TAG_INDEX_CACHE_KEY)
+
+
+def tagged_posts(tag):
+    # ids come from the (tag, content_type, object_id) index on the taggit through table
+    post_ids = TaggedItem.objects.filter(tag=tag, content_type=ContentType.objects.get_for_model(Post))
+    return Post.objects.filter(id__in=post_ids.values('object_id'))
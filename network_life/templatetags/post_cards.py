@@ -0,0 +1,16 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from network_life import fragments
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    return mark_safe(fragments.render_post_cards(list(posts), context['request']))
+
+
+@register.simple_tag
+def post_detail(post, images):
+    return mark_safe(fragments.render_post_detail(post, images))
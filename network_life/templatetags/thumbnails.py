@@ -0,0 +1,10 @@
+from django import template
+
+from network_life import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def srcset(image, variant, ext='jpg'):
+    return thumbnails.srcset(image, variant, ext)
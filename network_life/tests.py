@@ -1,6 +1,13 @@
+import asyncio
 import datetime
+import json
+import sqlite3
+import re
 import os
-from io import BytesIO
+import tempfile
+import time
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.contrib.auth import authenticate, get_user_model
 
@@ -9,15 +16,45 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "social_network.settings")
 import django
 from django.core.files.uploadedfile import SimpleUploadedFile
 
-from django.test import TestCase
-from django.test.client import Client
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.client import Client, RequestFactory
 from django.urls import reverse, resolve
-from django.test.utils import setup_test_environment
+from django.utils import timezone
+from django.test.utils import setup_test_environment, CaptureQueriesContext
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
 
 setup_test_environment()
 django.setup()
 
-from network_life.models import ProfilePage, User
+from django.contrib.sessions.models import Session
+from network_life.benchmarks import benchmark_targets, compare, run_benchmarks
+from network_life.middleware import RequestMetrics, _current, _timed_render, fingerprint, request_stats
+from network_life.models import ProfilePage, User, Post, Followers, TimelineEntry, OutgoingEmail, Recommendation, \
+    TrendingDecay
+from network_life.outbox import send_queued
+from network_life.pagination import paginate_posts
+from network_life.profiling import ProfileStore
+from network_life.recommendations import FollowGraph, recommended_accounts
+from network_life.routers import PrimaryReplicaRouter, ReplicaPinMiddleware, STICKY_COOKIE, copy_database
+from network_life.search import match_query, search_posts, search_profiles
+from network_life.fragments import fragment_stats
+from network_life.follows import recount_follows, toggle_follow
+from network_life.live import LikeCountHub, hub, live_likes, poll_database
+from network_life.likes import toggle_like, liked_post_ids, like_buffer, LikeBuffer
+from network_life.timeline import fan_out_post
+from network_life.trending import decay, trending_page
+from network_life.context_processors import profile_cache_key
+from network_life.tags import tag_index, invalidate_tag_index
+from network_life.thumbnails import make_thumbnails, srcset
+from network_life.uploads import LocalStorage
 from network_life.forms import CreateUserForm, PostForm, ProfilePageForm, ImageForm
 from network_life.views import like_unlike_post, home, create_post
 
@@ -211,3 +248,1297 @@ class TestViews(TestCase):
         # check with messages in response
         self.assertEqual(str(list(response_follow.context['messages'])[0]), f'You have just followed with john')
         self.assertEqual(str(list(response_unfollow.context['messages'])[0]), f'You have just unfollowed from john')
+
+
+class TestFeedPagination(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='feed_user', password='feedpassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='feed_user')
+        self.client = Client()
+        self.client.login(username='feed_user', password='feedpassword')
+
+        published = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+        self.posts = [
+            Post.objects.create(user=self.user, name='feed_user', main_image='img', preview='img',
+                                description=f'post {i}', date_published=published + datetime.timedelta(minutes=i // 2))
+            for i in range(5)
+        ]
+
+    def test_cursor_pages_cover_feed_once(self):
+        seen = []
+        cursor = None
+        while True:
+            posts, cursor = paginate_posts(Post.objects.all(), cursor, page_size=2)
+            seen.extend(posts)
+            if cursor is None:
+                break
+        self.assertEqual([p.id for p in seen], [p.id for p in reversed(self.posts)])
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        posts, _ = paginate_posts(Post.objects.all(), 'not-a-cursor', page_size=2)
+        self.assertEqual(posts[0].id, self.posts[-1].id)
+
+    def test_home_load_more(self):
+        response = self.client.get(reverse('network_life:home'), {'page_size': 3})
+        self.assertEqual(len(response.context['posts']), 3)
+        self.assertIsNotNone(response.context['next_cursor'])
+
+        response = self.client.get(reverse('network_life:home'),
+                                   {'page_size': 3, 'cursor': response.context['next_cursor']},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        data = response.json()
+        self.assertIsNone(data['next_cursor'])
+        self.assertIn('post 0', data['html'])
+
+
+class TestQueryCounts(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='counter', password='counterpassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='counter')
+        self.client = Client()
+        self.client.login(username='counter', password='counterpassword')
+
+    def add_posts(self, amount):
+        for i in range(Post.objects.count(), Post.objects.count() + amount):
+            post = Post.objects.create(user=self.user, name='counter', main_image='img', preview='img',
+                                       description=f'post {i}', date_published=datetime.datetime.now())
+            post.tags.add('tag1', 'tag2')
+            toggle_like(post.id, self.user)
+            Followers.objects.create(follower=User.objects.create_user(username=f'fan{i}'), followee=self.user)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_pages_use_fixed_number_of_queries(self):
+        urls = [reverse('network_life:home'),
+                reverse('network_life:profile', kwargs={'username': 'counter'}),
+                reverse('network_life:followers_accounts', kwargs={'username': 'counter'})]
+        self.add_posts(2)
+        few = [self.count_queries(url) for url in urls]
+        self.add_posts(8)
+        many = [self.count_queries(url) for url in urls]
+        self.assertEqual(few, many)
+
+    def test_home_card_data(self):
+        self.add_posts(1)
+        response = self.client.get(reverse('network_life:home'))
+        card = response.context['posts'][0]
+        self.assertEqual(card.like_count, 1)
+        self.assertIn('#tag1', response.content.decode())
+
+
+class TestLikeCounter(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='authorpassword')
+        self.user = User.objects.create_user(username='liker', password='likerpassword')
+        self.client = Client()
+        self.client.login(username='liker', password='likerpassword')
+        self.post = Post.objects.create(user=self.author, name='author', main_image='img', preview='img',
+                                        description='desc', date_published=datetime.datetime.now())
+
+    def like(self, post_id):
+        return self.client.post(reverse('network_life:like-post-view', kwargs={'post_id': post_id}),
+                                HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+
+    def test_toggle_returns_json_for_any_liker(self):
+        self.assertEqual(self.like(self.post.id).json(), {'value': True, 'amount_likes': 1})
+        self.assertEqual(self.like(self.post.id).json(), {'value': False, 'amount_likes': 0})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(self.post.likes.exists())
+
+    def test_concurrent_like_of_the_same_user(self):
+        # the other click's like lands between this click's delete and insert
+        self.post.likes.add(self.user)
+        Post.objects.filter(id=self.post.id).update(like_count=1)
+        with mock.patch('django.db.models.query.QuerySet.delete', return_value=(0, {})):
+            self.assertEqual(toggle_like(self.post.id, self.user), (True, 1))
+        self.assertEqual(self.post.likes.count(), 1)
+
+    def test_like_missing_post(self):
+        self.assertEqual(self.like(self.post.id + 100).status_code, 404)
+
+    def test_reconcile_like_counts(self):
+        self.post.likes.add(self.user, self.author)
+        call_command('reconcile_like_counts', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 2)
+
+    def test_buffered_likes(self):
+        buffer = LikeBuffer(flush_size=100, flush_interval=0)
+        other = User.objects.create_user(username='other')
+        self.assertEqual(buffer.toggle(self.post.id, self.user.id), (True, 1))
+        self.assertEqual(buffer.toggle(self.post.id, other.id), (True, 2))
+        self.assertEqual(buffer.toggle(self.post.id, other.id), (False, 1))
+        # nothing is written until the flush
+        self.assertFalse(self.post.likes.exists())
+
+        self.assertEqual(buffer.flush(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(list(self.post.likes.all()), [self.user])
+
+        self.assertEqual(buffer.toggle(self.post.id, self.user.id), (False, 0))
+        buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(self.post.likes.exists())
+
+    def test_click_during_flush(self):
+        class ClickingBuffer(LikeBuffer):
+            # the user clicks again while the batch with their like is being written
+            def _write(buffer, pending):
+                if not hasattr(buffer, 'clicked'):
+                    buffer.clicked = buffer.toggle(self.post.id, self.user.id)
+                return super()._write(pending)
+
+        buffer = ClickingBuffer(flush_size=100, flush_interval=0)
+        buffer.toggle(self.post.id, self.user.id)
+        buffer.flush()
+        # the in-flight like counts as stored, so the second click is an unlike
+        self.assertEqual(buffer.clicked, (False, 0))
+        buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.like_count, self.post.likes.count()), (0, 0))
+
+    def like_batch(self, likes):
+        return self.client.post(reverse('network_life:api_likes'), json.dumps({'likes': likes}),
+                                content_type='application/json')
+
+    def test_like_batch(self):
+        second = Post.objects.create(user=self.author, name='author', main_image='img', preview='img',
+                                     description='second', date_published=datetime.datetime.now())
+        likes = {str(self.post.id): True, str(second.id): True, str(second.id + 100): True}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.like_batch(likes)
+        # session, user, the posts, the stored likes, insert, count update, the new counts
+        self.assertEqual(len([query for query in queries if 'SAVEPOINT' not in query['sql']]), 7)
+        self.assertEqual(response.json(), {'posts': {str(self.post.id): {'liked': True, 'like_count': 1},
+                                                     str(second.id): {'liked': True, 'like_count': 1}}})
+        # the same batch again changes nothing
+        self.assertEqual(self.like_batch(likes).json(), response.json())
+        self.assertEqual(self.post.likes.count(), 1)
+
+        response = self.like_batch({str(self.post.id): False, str(second.id): True})
+        self.assertEqual(response.json()['posts'][str(self.post.id)], {'liked': False, 'like_count': 0})
+        self.assertEqual(list(Post.objects.order_by('id').values_list('like_count', flat=True)), [0, 1])
+        self.assertEqual(list(second.likes.all()), [self.user])
+
+    def test_like_batch_rejects_bad_input(self):
+        self.assertEqual(self.like_batch({str(self.post.id): 'yes'}).status_code, 400)
+        self.assertEqual(self.like_batch(['not', 'a', 'map']).status_code, 400)
+        with self.settings(LIKES_BATCH_SIZE=1):
+            self.assertEqual(self.like_batch({'1': True, '2': True}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.like_batch({str(self.post.id): True}).status_code, 401)
+
+    @override_settings(LIKES_BUFFERED=True)
+    def test_like_batch_buffered(self):
+        like_buffer.flush()
+        self.assertEqual(self.like_batch({str(self.post.id): True}).json()['posts'][str(self.post.id)],
+                         {'liked': True, 'like_count': 1})
+        self.assertEqual(self.like_batch({str(self.post.id): True}).json()['posts'][str(self.post.id)],
+                         {'liked': True, 'like_count': 1})
+        # rendered as liked before the flush
+        self.assertEqual(liked_post_ids(self.user, [self.post.id]), {self.post.id})
+        like_buffer.flush()
+        self.assertEqual(list(self.post.likes.all()), [self.user])
+
+
+class TestFollowingTimeline(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader', password='readerpassword')
+        ProfilePage.objects.create(pk=self.reader.pk, username='reader')
+        self.author = User.objects.create_user(username='writer')
+        ProfilePage.objects.create(pk=self.author.pk, username='writer')
+        self.stranger = User.objects.create_user(username='stranger')
+        self.client = Client()
+        self.client.login(username='reader', password='readerpassword')
+
+    def publish(self, user):
+        post = Post.objects.create(user=user, name=user.username, main_image='img', preview='img',
+                                   description=f'by {user.username}', date_published=datetime.datetime.now())
+        fan_out_post(post)
+        return post
+
+    def timeline(self):
+        response = self.client.get(reverse('network_life:following_feed'))
+        self.assertEqual(response.status_code, 200)
+        return [post.id for post in response.context['posts']]
+
+    def test_fan_out_on_write(self):
+        old = self.publish(self.author)
+        self.client.post(reverse('network_life:follow', kwargs={'follower': 'writer', 'user': 'reader'}))
+        new = self.publish(self.author)
+        self.publish(self.stranger)
+        self.assertEqual(TimelineEntry.objects.filter(owner=self.reader).count(), 2)
+        self.assertEqual(self.timeline(), [new.id, old.id])
+
+        self.client.post(reverse('network_life:follow', kwargs={'follower': 'writer', 'user': 'reader'}))
+        self.assertEqual(self.timeline(), [])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_big_accounts_are_read_on_the_fly(self):
+        self.client.post(reverse('network_life:follow', kwargs={'follower': 'writer', 'user': 'reader'}))
+        post = self.publish(self.author)
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader).exists())
+        self.assertEqual(self.timeline(), [post.id])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_fan_out_follows_the_counter(self):
+        self.client.post(reverse('network_life:follow', kwargs={'follower': 'writer', 'user': 'reader'}))
+        # the counter says big even though only one follow row exists: pulled at read time, not pushed
+        ProfilePage.objects.filter(pk=self.author.pk).update(followers_count=2)
+        post = self.publish(self.author)
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader).exists())
+        self.assertEqual(self.timeline(), [post.id])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_shrinking_account_is_backfilled(self):
+        fan = User.objects.create_user(username='fan')
+        ProfilePage.objects.create(pk=fan.pk, username='fan')
+        self.client.post(reverse('network_life:follow', kwargs={'follower': 'writer', 'user': 'reader'}))
+        fan_client = Client()
+        fan_client.force_login(fan)
+        fan_client.post(reverse('network_life:follow', kwargs={'follower': 'writer', 'user': 'fan'}))
+        post = self.publish(self.author)
+        self.assertFalse(TimelineEntry.objects.filter(owner=self.reader).exists())
+
+        # back at the limit the account is no longer merged in, its posts are pushed instead
+        fan_client.post(reverse('network_life:follow', kwargs={'follower': 'writer', 'user': 'fan'}))
+        self.assertEqual(self.timeline(), [post.id])
+        self.assertTrue(TimelineEntry.objects.filter(owner=self.reader, post=post).exists())
+
+
+class TestFollowGraph(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='fan', password='fanpassword')
+        self.star = User.objects.create_user(username='star')
+        ProfilePage.objects.create(pk=self.user.pk, username='fan')
+        ProfilePage.objects.create(pk=self.star.pk, username='star')
+        self.client = Client()
+        self.client.login(username='fan', password='fanpassword')
+
+    def follow(self):
+        return self.client.post(reverse('network_life:follow', kwargs={'follower': 'star', 'user': 'fan'}))
+
+    def test_follow_keeps_counters(self):
+        self.follow()
+        self.assertTrue(Followers.objects.filter(follower=self.user, followee=self.star).exists())
+        self.assertEqual(ProfilePage.objects.get(username='star').followers_count, 1)
+        self.assertEqual(ProfilePage.objects.get(username='fan').following_count, 1)
+
+        response = self.client.get(reverse('network_life:profile', kwargs={'username': 'star'}))
+        self.assertEqual(response.context['followers_amount'], 1)
+        self.assertEqual(response.context['button_text'], 'Unfollow')
+
+        self.follow()
+        self.assertFalse(Followers.objects.exists())
+        self.assertEqual(ProfilePage.objects.get(username='star').followers_count, 0)
+        self.assertEqual(ProfilePage.objects.get(username='fan').following_count, 0)
+
+    def test_follow_unknown_account(self):
+        response = self.client.post(reverse('network_life:follow', kwargs={'follower': 'nobody', 'user': 'fan'}))
+        self.assertEqual(response.status_code, 404)
+
+
+class TestProfileCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='cached', password='cachedpassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='cached')
+        self.client = Client()
+        self.client.login(username='cached', password='cachedpassword')
+
+    def profile_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('network_life:create'))
+        return [q['sql'] for q in queries if 'network_life_profilepage' in q['sql']]
+
+    def test_navbar_avatar_is_cached(self):
+        self.assertEqual(len(self.profile_queries()), 1)
+        self.assertEqual(self.profile_queries(), [])
+
+    def test_update_profile_invalidates(self):
+        self.profile_queries()
+        self.client.post('{0}?user=cached'.format(reverse('network_life:update_profile')), {'bio': 'new bio'})
+        self.assertIsNone(cache.get(profile_cache_key(self.user.pk)))
+
+
+class TestTags(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='tagger', password='taggerpassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='tagger')
+        self.client = Client()
+        self.client.login(username='tagger', password='taggerpassword')
+
+    def publish(self, *tags):
+        post = Post.objects.create(user=self.user, name='tagger', main_image='img', preview='img',
+                                   description='desc', date_published=datetime.datetime.now())
+        post.tags.add(*tags)
+        return post
+
+    def test_tag_index_counts(self):
+        self.publish('sport', 'relax')
+        self.publish('sport')
+        self.assertEqual([(el['slug'], el['amount']) for el in tag_index()], [('sport', 2), ('relax', 1)])
+
+        # cached until invalidated
+        self.publish('travelling')
+        self.assertEqual(len(tag_index()), 2)
+        invalidate_tag_index()
+        self.assertEqual(len(tag_index()), 3)
+
+    def test_tag_feed(self):
+        tagged = self.publish('sport')
+        self.publish('relax')
+        response = self.client.get(reverse('network_life:tag_feed', kwargs={'slug': 'sport'}))
+        self.assertEqual([post.id for post in response.context['posts']], [tagged.id])
+        self.assertEqual(self.client.get(reverse('network_life:tag_feed', kwargs={'slug': 'nope'})).status_code, 404)
+
+    def test_unicode_and_symbol_tags(self):
+        tagged = self.publish('путешествия', '!!!')
+        self.assertEqual([el['slug'] for el in tag_index()], ['путешествия'])
+        response = self.client.get(reverse('network_life:home'))
+        self.assertContains(response, reverse('network_life:tag_feed', kwargs={'slug': 'путешествия'}))
+        self.assertContains(response, '#!!!')
+        response = self.client.get(reverse('network_life:tag_feed', kwargs={'slug': 'путешествия'}))
+        self.assertEqual([post.id for post in response.context['posts']], [tagged.id])
+        self.assertEqual(self.client.get(reverse('network_life:post', args=[tagged.id])).status_code, 200)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionError('SMTP is down')
+
+
+class ConcurrentWorkerEmailBackend(BaseEmailBackend):
+    # a second send_outbox worker runs the outbox while the first one is sending
+    sent = []
+
+    def send_messages(self, email_messages):
+        first = not self.sent
+        self.sent.extend(message.to[0] for message in email_messages)
+        if first:
+            send_queued()
+        return len(email_messages)
+
+
+class TestOutbox(TestCase):
+    def register(self):
+        data = {'username': 'new_user', 'email': 'new_user@gmail.com', 'password1': 'Partenit14',
+                'password2': 'Partenit14'}
+        self.client.post(reverse('network_life:register'), data=data)
+
+    def test_register_queues_activation_email(self):
+        self.register()
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutgoingEmail.objects.get().to, ['new_user@gmail.com'])
+
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.SENT)
+
+    @override_settings(EMAIL_BACKEND='network_life.tests.FailingEmailBackend')
+    def test_failed_send_is_retried_later(self):
+        self.register()
+        call_command('send_outbox', '--max-attempts=2', stdout=StringIO())
+        outgoing = OutgoingEmail.objects.get()
+        self.assertEqual((outgoing.status, outgoing.attempts), (OutgoingEmail.PENDING, 1))
+        self.assertIn('SMTP is down', outgoing.last_error)
+
+        OutgoingEmail.objects.update(next_attempt_at=outgoing.created_at)
+        call_command('send_outbox', '--max-attempts=2', stdout=StringIO())
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.FAILED)
+
+    @override_settings(EMAIL_BACKEND='network_life.tests.ConcurrentWorkerEmailBackend')
+    def test_workers_never_send_twice(self):
+        ConcurrentWorkerEmailBackend.sent = []
+        for address in ('one@example.com', 'two@example.com', 'three@example.com'):
+            OutgoingEmail.objects.create(subject='hi', body='hi', to=[address])
+        sent, failed = send_queued()
+        self.assertEqual(sorted(ConcurrentWorkerEmailBackend.sent),
+                         ['one@example.com', 'three@example.com', 'two@example.com'])
+        self.assertEqual(sent, 1)
+        self.assertEqual(set(OutgoingEmail.objects.values_list('status', flat=True)), {OutgoingEmail.SENT})
+
+    def test_abandoned_claim_is_taken_over(self):
+        outgoing = OutgoingEmail.objects.create(subject='hi', body='hi', to=['one@example.com'],
+                                                status=OutgoingEmail.SENDING, attempts=1)
+        self.assertEqual(send_queued(), (1, 0))
+        outgoing.refresh_from_db()
+        self.assertEqual((outgoing.status, outgoing.attempts), (OutgoingEmail.SENT, 2))
+
+
+class TestImageUploads(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.user = User.objects.create_user(username='uploader', password='uploaderpassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='uploader')
+        self.client = Client()
+        self.client.login(username='uploader', password='uploaderpassword')
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def image(self, name):
+        f = BytesIO()
+        Image.new(mode='RGB', size=(10, 10)).save(f, 'png')
+        return SimpleUploadedFile(name, f.getvalue())
+
+    def test_create_post_uploads_all_images(self):
+        with self.settings(IMAGE_STORAGE='network_life.uploads.LocalStorage', LOCAL_UPLOAD_ROOT=self.root.name,
+                           THUMBNAIL_ROOT=self.root.name):
+            response = self.client.post(reverse('network_life:create'), {
+                'main_image': self.image('main.png'),
+                'images': [self.image('one.png'), self.image('two.png')],
+                'description': 'desc',
+                'tags': 'tag1',
+            })
+        self.assertEqual(response.status_code, 302)
+        post = Post.objects.get(user=self.user)
+        self.assertTrue(post.main_image.public_id.startswith('NetworkLife*/images/'))
+        # uploaded separately with the preview field's folder
+        self.assertTrue(post.preview.public_id.startswith('NetworkLife*/preview/'))
+        self.assertNotEqual(post.preview.public_id, post.main_image.public_id)
+        self.assertEqual(post.images.count(), 2)
+
+    def test_failed_save_deletes_uploads(self):
+        uploads = os.path.join(self.root.name, 'uploads')
+        with self.settings(IMAGE_STORAGE='network_life.uploads.LocalStorage', LOCAL_UPLOAD_ROOT=uploads,
+                           THUMBNAIL_ROOT=os.path.join(self.root.name, 'thumbnails')), \
+                mock.patch('network_life.views.fan_out_post', side_effect=RuntimeError('database is down')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(reverse('network_life:create'), {
+                    'main_image': self.image('main.png'), 'images': [self.image('one.png')], 'description': 'desc',
+                    'tags': 'tag1',
+                })
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual([files for _, _, files in os.walk(uploads) if files], [])
+
+    def test_local_storage_accepts_unreadable_images(self):
+        field = Post._meta.get_field('main_image')
+        with self.settings(THUMBNAIL_ROOT=self.root.name):
+            resource = LocalStorage(self.root.name).upload(SimpleUploadedFile('broken.jpg', b'\0' * 100), field)
+        self.assertTrue(os.path.exists(os.path.join(self.root.name, f'{resource.public_id}.jpg')))
+
+
+class TestThumbnails(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = tempfile.TemporaryDirectory()
+        self.source = f'{self.root.name}/photo.jpg'
+        Image.new(mode='RGB', size=(2000, 1000)).save(self.source, 'jpeg')
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_variants_in_both_formats(self):
+        written = make_thumbnails(self.source, 'images/photo', f'{self.root.name}/thumbs',
+                                  {'feed': [600, 1200], 'grid': [300]})
+        self.assertEqual(len(written), 6)
+        with Image.open(f'{self.root.name}/thumbs/images/photo_300.webp') as thumbnail:
+            self.assertEqual(thumbnail.size, (300, 150))
+
+    def test_srcset_prefers_local_thumbnails(self):
+        field = Post._meta.get_field('preview')
+        resource = field.parse_cloudinary_resource('images/photo.jpg')
+        variants = {'feed': [600, 1200]}
+        with self.settings(THUMBNAIL_ROOT=self.root.name, THUMBNAIL_VARIANTS=variants, THUMBNAIL_URL='/thumbs/'):
+            self.assertIn('res.cloudinary.com', srcset(resource, 'feed'))
+            make_thumbnails(self.source, resource.public_id)
+            self.assertEqual(srcset(resource, 'feed', 'webp'),
+                             '/thumbs/images/photo_600.webp 600w, /thumbs/images/photo_1200.webp 1200w')
+
+    def test_small_source_is_not_scaled_up(self):
+        Image.new(mode='RGB', size=(800, 400)).save(self.source, 'jpeg')
+        field = Post._meta.get_field('preview')
+        resource = field.parse_cloudinary_resource('images/small.jpg')
+        with self.settings(THUMBNAIL_ROOT=self.root.name, THUMBNAIL_VARIANTS={'feed': [600, 1200]},
+                           THUMBNAIL_URL='/thumbs/'):
+            written = make_thumbnails(self.source, resource.public_id)
+            self.assertEqual(len(written), 4)
+            # advertised at the width the file really has
+            self.assertEqual(srcset(resource, 'feed'),
+                             '/thumbs/images/small_600.jpg 600w, /thumbs/images/small_800.jpg 800w')
+            # the manifest is read once per image, not on every render
+            os.remove(f'{self.root.name}/images/small.json')
+            self.assertIn('/thumbs/', srcset(resource, 'feed'))
+
+    def test_navbar_avatar_uses_thumbnails(self):
+        user = User.objects.create_user(username='pictured', password='picturedpassword')
+        ProfilePage.objects.create(pk=user.pk, username='pictured', avatar='avatars/face.jpg')
+        client = Client()
+        client.login(username='pictured', password='picturedpassword')
+        with self.settings(THUMBNAIL_ROOT=self.root.name, THUMBNAIL_URL='/thumbs/'):
+            make_thumbnails(self.source, 'avatars/face')
+            response = client.get(reverse('network_life:home'))
+        self.assertContains(response, '/thumbs/avatars/face_32.webp 32w, /thumbs/avatars/face_64.webp 64w')
+
+
+class TestSeedData(TestCase):
+    def test_seed_data(self):
+        call_command('seed_data', '--users=30', '--chunk-size=7', '--seed=1', stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='seed_').count(), 30)
+        self.assertEqual(ProfilePage.objects.filter(username__startswith='seed_').count(), 30)
+        self.assertTrue(Post.objects.exists())
+        # counters match the rows they summarize
+        for post in Post.objects.all():
+            self.assertEqual(post.like_count, post.likes.count())
+        for profile in ProfilePage.objects.filter(username__startswith='seed_'):
+            self.assertEqual(profile.followers_count, Followers.objects.filter(followee_id=profile.pk).count())
+        self.assertTrue(authenticate(username='seed_0', password='password123'))
+        # every post is in the timelines of its author and the author's followers
+        for post in Post.objects.all()[:20]:
+            owners = set(TimelineEntry.objects.filter(post=post).values_list('owner_id', flat=True))
+            self.assertEqual(owners, {post.user_id, *Followers.objects.filter(followee_id=post.user_id)
+                                      .values_list('follower_id', flat=True)})
+
+    def test_seed_data_trending_scores(self):
+        call_command('seed_data', '--users=30', '--days=1', '--seed=1', stdout=StringIO())
+        # scores are the decayed likes, so /trending/ has posts right after seeding
+        self.assertTrue(trending_page()[0])
+        for like_count, score in Post.objects.values_list('like_count', 'trending_score'):
+            self.assertLessEqual(score, like_count)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_seed_data_skips_fan_out_of_big_accounts(self):
+        call_command('seed_data', '--users=20', '--seed=1', stdout=StringIO())
+        self.assertEqual(TimelineEntry.objects.count(), Post.objects.count())
+
+
+class TestViewBenchmarks(TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_run_benchmarks(self):
+        call_command('seed_data', '--users=20', '--seed=1', stdout=StringIO())
+        username, post_id = benchmark_targets()
+        client = Client()
+        client.login(username=username, password='password123')
+        with self.settings(IMAGE_STORAGE='network_life.uploads.LocalStorage', LOCAL_UPLOAD_ROOT=self.root.name,
+                           THUMBNAIL_ROOT=self.root.name):
+            report = run_benchmarks(client, username, post_id, requests=3, warmup=1)
+        self.assertEqual(set(report), {'home', 'post', 'profile', 'followers_accounts', 'following_accounts',
+                                       'like_unlike_post', 'create_post'})
+        for row in report.values():
+            self.assertLessEqual(row['p50_ms'], row['p95_ms'])
+            self.assertGreater(row['queries'], 0)
+        # the report is its own baseline
+        self.assertEqual(compare(report, report), [])
+
+    def test_compare(self):
+        baseline = {'home': {'p50_ms': 20, 'p95_ms': 30, 'queries': 4, 'peak_kb': 500}}
+        self.assertEqual(compare({'home': {'p50_ms': 25, 'p95_ms': 38, 'queries': 4, 'peak_kb': 550}}, baseline), [])
+        regressions = compare({'home': {'p50_ms': 50, 'p95_ms': 80, 'queries': 5, 'peak_kb': 900}}, baseline)
+        self.assertEqual(len(regressions), 3)
+        self.assertEqual(compare({}, baseline), ['home: missing from report'])
+
+
+@override_settings(REQUEST_METRICS=True)
+class TestRequestMetrics(TestCase):
+    def setUp(self):
+        request_stats.reset()
+        self.user = User.objects.create_user(username='metrics', password='metricspassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='metrics')
+        self.client = Client()
+        self.client.login(username='metrics', password='metricspassword')
+
+    def test_server_timing_and_log(self):
+        with self.assertLogs('network_life.requests', 'INFO') as logs:
+            response = self.client.get(reverse('network_life:home'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, total;dur=')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'network_life:home')
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.client.get(reverse('network_life:home'))
+        self.assertEqual(self.client.get(reverse('network_life:request_stats')).status_code, 302)
+
+        self.user.is_staff = True
+        self.user.save()
+        stats = self.client.get(reverse('network_life:request_stats')).json()
+        self.assertEqual(stats['network_life:home']['requests'], 1)
+        self.assertEqual(sum(stats['network_life:home']['histogram'].values()), 1)
+
+    def test_n_plus_one_fingerprints(self):
+        self.assertEqual(fingerprint('SELECT * FROM post WHERE id IN (%s, %s, %s) LIMIT 21'),
+                         'SELECT * FROM post WHERE id IN (...) LIMIT ?')
+        metrics = RequestMetrics()
+        metrics.queries = [('SELECT name FROM tag WHERE id = %s', repr((i,))) for i in range(6)]
+        metrics.queries.append(metrics.queries[0])
+        self.assertEqual(metrics.similar(5), {'SELECT name FROM tag WHERE id = %s': 7})
+        self.assertEqual(metrics.duplicates(), 1)
+
+    def test_nested_renders_are_timed_once(self):
+        metrics = RequestMetrics()
+
+        def render(template, nested=False):
+            if nested:
+                # a fragment rendered by a template tag, running a 50 ms query
+                time.sleep(0.05)
+                metrics.db_time += 0.05
+                return ''
+            return timed_render(template, nested=True)
+
+        timed_render = _timed_render(render)
+        token = _current.set(metrics)
+        try:
+            timed_render(None)
+        finally:
+            _current.reset(token)
+        self.assertLess(metrics.template_time, 0.02)
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher', password='searcherpassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='searcher', first_name='Olena', bio='Mountain hiker')
+        self.client = Client()
+        self.client.login(username='searcher', password='searcherpassword')
+
+    def add_post(self, description, tags=()):
+        post = Post.objects.create(user=self.user, name='searcher', main_image='sample', preview='sample',
+                                   description=description)
+        post.tags.add(*tags)
+        return post
+
+    def test_match_query(self):
+        self.assertEqual(match_query('trav "OR" -x'), '"trav"* "OR"* "x"*')
+        self.assertIsNone(match_query(' "* '))
+
+    def test_search_posts(self):
+        in_tags = self.add_post('A weekend away', ['travelling'])
+        in_text = self.add_post('Travelling with friends')
+        self.add_post('Nothing to see here')
+
+        posts, next_page = search_posts('trav')
+        # tags weigh more than the description
+        self.assertEqual(posts, [in_tags, in_text])
+        self.assertIsNone(next_page)
+
+        posts, next_page = search_posts('trav', page=1, page_size=1)
+        self.assertEqual((posts, next_page), ([in_tags], 2))
+        self.assertEqual(search_posts('trav', page=2, page_size=1), ([in_text], None))
+
+        # only the newest SEARCH_CANDIDATES matches are ranked
+        newest = self.add_post('Travelling again')
+        with self.settings(SEARCH_CANDIDATES=2):
+            self.assertCountEqual(search_posts('trav')[0], [in_text, newest])
+
+    def test_index_follows_changes(self):
+        post = self.add_post('Sunny beach')
+        post.description = 'Rainy city'
+        post.save()
+        self.assertEqual(search_posts('beach')[0], [])
+        self.assertEqual(search_posts('rainy')[0], [post])
+        post.tags.remove()
+        post.tags.add('sea')
+        self.assertEqual(search_posts('sea')[0], [post])
+        post.tags.clear()
+        self.assertEqual(search_posts('sea')[0], [])
+        post.delete()
+        self.assertEqual(search_posts('rainy')[0], [])
+
+    def test_search_profiles(self):
+        self.assertEqual([p.username for p in search_profiles('olena')], ['searcher'])
+        profile = ProfilePage.objects.get(username='searcher')
+        profile.bio = 'Sea swimmer'
+        profile.save()
+        self.assertEqual(search_profiles('hiker'), [])
+        self.assertEqual(search_profiles('swim'), [profile])
+
+    def test_counter_updates_skip_index(self):
+        post = self.add_post('Sunny beach')
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE network_life_post_search SET description = 'stale' WHERE rowid = %s", [post.id])
+            cursor.execute("UPDATE network_life_profile_search SET bio = 'stale' WHERE rowid = %s", [self.user.pk])
+        Post.objects.filter(id=post.id).touch(like_count=3)
+        post.refresh_from_db()
+        post.save()
+        ProfilePage.objects.filter(pk=self.user.pk).update(followers_count=5)
+        # the searched columns didn't change, so the triggers left the index rows alone
+        self.assertEqual(search_posts('stale')[0], [post])
+        self.assertEqual([p.username for p in search_profiles('stale')], ['searcher'])
+
+    def test_rebuild_index(self):
+        post = self.add_post('Old description', ['sport'])
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM network_life_post_search')
+        self.assertEqual(search_posts('sport')[0], [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_posts('sport')[0], [post])
+
+    def test_search_view(self):
+        post = self.add_post('Morning run', ['sport'])
+        response = self.client.get(reverse('network_life:search'), {'q': 'run'})
+        self.assertEqual(response.context['posts'], [post])
+        self.assertContains(response, 'Results for')
+        response = self.client.get(reverse('network_life:search'), {'q': 'run', 'cursor': 2},
+                                   HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.json()['next_cursor'], None)
+
+
+class TestFragmentCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragment_stats.reset()
+        self.user = User.objects.create_user(username='cards', password='cardspassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='cards')
+        self.post = Post.objects.create(user=self.user, name='cards', main_image='sample', preview='sample',
+                                        description='First card')
+        self.post.tags.add('sport')
+        self.client = Client(enforce_csrf_checks=True)
+        self.client.login(username='cards', password='cardspassword')
+
+    def get_home(self):
+        return self.client.get(reverse('network_life:home')).content.decode()
+
+    def test_cards_are_cached_per_version(self):
+        first = self.get_home()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.get_home()
+        self.assertEqual(fragment_stats.snapshot()['card'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+        # only the (masked) CSRF token differs
+        strip_token = lambda html: re.sub(r'name="csrfmiddlewaretoken" value="\w+"', '', html)
+        self.assertEqual(strip_token(first), strip_token(second))
+        # the cached card needs no tags query
+        self.assertFalse([q for q in queries if 'taggit_tag' in q['sql']])
+
+        toggle_like(self.post.id, self.user)
+        self.assertIn('#sport', self.get_home())
+        self.post.tags.add('relax')
+        self.assertIn('#relax', self.get_home())
+        self.post.description = 'Edited card'
+        self.post.save()
+        self.assertIn('Edited card', self.get_home())
+        self.assertEqual(fragment_stats.snapshot()['card']['misses'], 4)
+
+    def test_like_form_is_per_viewer(self):
+        self.get_home()
+        other = User.objects.create_user(username='viewer', password='viewerpassword')
+        client = Client()
+        client.login(username='viewer', password='viewerpassword')
+        html = client.get(reverse('network_life:home')).content.decode()
+        self.assertEqual(fragment_stats.snapshot()['card']['hits'], 1)
+        self.assertIn('name="csrfmiddlewaretoken"', html)
+        self.assertIn('class="likes-count"', html)
+
+    def test_post_page_is_cached(self):
+        url = reverse('network_life:post', kwargs={'id': self.post.id})
+        self.assertContains(self.client.get(url), 'First card')
+        self.assertContains(self.client.get(url), 'First card')
+        toggle_like(self.post.id, self.user)
+        self.assertContains(self.client.get(url), '1 likes')
+        self.assertEqual(fragment_stats.snapshot()['post'], {'hits': 1, 'misses': 2, 'hit_rate': 0.333})
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get(reverse('network_life:fragment_stats')).status_code, 302)
+        self.user.is_staff = True
+        self.user.save()
+        self.get_home()
+        self.assertEqual(self.client.get(reverse('network_life:fragment_stats')).json()['card']['misses'], 1)
+
+
+class TestFeedApi(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='api', password='apipassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='api')
+        self.posts = [Post.objects.create(user=self.user, name='api', main_image='sample', preview='sample',
+                                          description=f'api post {i}') for i in range(3)]
+        self.posts[0].tags.add('sport')
+        self.client = Client()
+        self.client.login(username='api', password='apipassword')
+
+    def test_feed_pages(self):
+        url = reverse('network_life:api_feed')
+        data = self.client.get(url, {'page_size': 2}).json()
+        self.assertEqual([post['id'] for post in data['posts']], [self.posts[2].id, self.posts[1].id])
+        self.assertEqual(set(data['posts'][0]), {'id', 'author', 'description', 'preview', 'like_count', 'tags',
+                                                 'date_published'})
+        data = self.client.get(url, {'page_size': 2, 'cursor': data['next_cursor']}).json()
+        self.assertEqual(data['posts'][0]['tags'], ['sport'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_field_selection(self):
+        url = reverse('network_life:api_profile_posts', kwargs={'username': 'api'})
+        data = self.client.get(url, {'fields': 'id,like_count'}).json()
+        self.assertEqual(data['posts'][0], {'id': self.posts[2].id, 'like_count': 0})
+        self.assertEqual(self.client.get(url, {'fields': 'id,password'}).status_code, 400)
+
+    def test_conditional_get(self):
+        url = reverse('network_life:api_post', kwargs={'id': self.posts[0].id})
+        response = self.client.get(url)
+        self.assertEqual(response.json()['post']['images'], [])
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        toggle_like(self.posts[0].id, self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['post']['like_count'], 1)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_feed_etag_changes_with_new_posts(self):
+        url = reverse('network_life:api_feed')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Post.objects.create(user=self.user, name='api', main_image='sample', preview='sample', description='new')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_login_required(self):
+        self.assertEqual(Client().get(reverse('network_life:api_feed')).status_code, 401)
+
+
+class TestConditionalPages(TestCase):
+    def setUp(self):
+        # rendered cards are cached by post id and version, and ids come back after every rollback
+        cache.clear()
+        self.user = User.objects.create_user(username='etag', password='etagpassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='etag')
+        self.other = User.objects.create_user(username='other')
+        ProfilePage.objects.create(pk=self.other.pk, username='other')
+        self.post = Post.objects.create(user=self.other, name='other', main_image='sample', preview='sample',
+                                        description='etag post')
+        self.client = Client()
+        self.client.login(username='etag', password='etagpassword')
+
+    def tearDown(self):
+        cache.clear()
+
+    def revalidate(self, url):
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response.status_code, len(queries), etag
+
+    def test_home(self):
+        url = reverse('network_life:home')
+        status, queries, etag = self.revalidate(url)
+        # session, user and the version stamp
+        self.assertEqual((status, queries), (304, 3))
+
+        toggle_like(self.post.id, self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(user=self.other, name='other', main_image='sample', preview='sample', description='new')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_profile(self):
+        url = reverse('network_life:profile', kwargs={'username': 'other'})
+        status, queries, etag = self.revalidate(url)
+        self.assertEqual((status, queries), (304, 3))
+
+        toggle_follow(self.user, self.other)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # the follow message has to be shown, no revalidation while it is pending
+        response = self.client.post(reverse('network_life:follow', kwargs={'follower': 'other', 'user': 'etag'}))
+        self.assertFalse(self.client.get(response.url).has_header('ETag'))
+        self.assertTrue(self.client.get(url).has_header('ETag'))
+
+    def test_other_viewer_gets_own_etag(self):
+        url = reverse('network_life:home')
+        etag = self.client.get(url)['ETag']
+        client = Client()
+        client.force_login(self.other)
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+@override_settings(DATABASE_REPLICAS=['replica0'])
+class TestReplicaRouter(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        # the database network_life.views.home would read from inside the middleware
+        used = {}
+
+        def get_response(request):
+            middleware.process_view(request, home, (), {})
+            if write:
+                self.router.db_for_write(Post)
+            used['read'] = self.router.db_for_read(Post)
+            used['session'] = self.router.db_for_read(Session)
+            return HttpResponse()
+
+        middleware = ReplicaPinMiddleware(get_response)
+        return used, middleware(request)
+
+    def test_reads_outside_requests_use_primary(self):
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_get_reads_from_replica(self):
+        used, response = self.route(self.factory.get('/'))
+        self.assertEqual(used, {'read': 'replica0', 'session': 'default'})
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_write_pins_to_primary(self):
+        used, response = self.route(self.factory.get('/'), write=True)
+        self.assertEqual(used['read'], 'default')
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.route(request)[0]['read'], 'default')
+
+    def test_post_reads_from_primary(self):
+        self.assertEqual(self.route(self.factory.post('/'))[0]['read'], 'default')
+
+    def test_copy_database(self):
+        folder = tempfile.mkdtemp()
+        source, target = os.path.join(folder, 'primary.sqlite3'), os.path.join(folder, 'replica.sqlite3')
+        with sqlite3.connect(source) as db:
+            db.execute('CREATE TABLE post (id INTEGER PRIMARY KEY)')
+            db.execute('INSERT INTO post VALUES (1), (2)')
+        copy_database(source, target)
+        db = sqlite3.connect(target)
+        self.assertEqual(db.execute('SELECT count(*) FROM post').fetchone(), (2,))
+        db.close()
+
+class TestLiveLikes(TestCase):
+    def setUp(self):
+        hub.reset()
+        self.user = User.objects.create_user(username='watcher', password='watcherpassword')
+        self.post = Post.objects.create(user=self.user, name='watcher', main_image='img', preview='img',
+                                        description='live', date_published=datetime.datetime.now())
+        self.client = Client()
+        self.client.login(username='watcher', password='watcherpassword')
+
+    def test_hub_coalesces_changes(self):
+        counts = LikeCountHub(max_tracked=2)
+        counts.publish({1: 1})
+        counts.publish({1: 2, 2: 5})
+        counts.publish({2: 5})
+        self.assertEqual(counts.changes([1, 2, 3], 0), ({1: 2, 2: 5}, 3))
+        self.assertEqual(counts.changes([1, 2], 3), ({}, 3))
+        counts.publish({3: 1})
+        # post 1 was dropped, a stream that has not seen it must reload
+        self.assertEqual(counts.changes([1], 1), (None, 4))
+        self.assertEqual(counts.changes([3], 3), ({3: 1}, 4))
+
+    def test_event_ids_of_other_processes(self):
+        counts = LikeCountHub()
+        counts.publish({1: 1, 2: 1})
+        self.assertEqual(counts.parse_event_id(counts.event_id(1)), 1)
+        self.assertIsNone(counts.parse_event_id(LikeCountHub().event_id(1)))
+        self.assertIsNone(counts.parse_event_id(counts.event_id(3)))
+        self.assertIsNone(counts.parse_event_id('1'))
+
+    def test_likes_are_published(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_like(self.post.id, self.user)
+        self.assertEqual(hub.changes([self.post.id], 0)[0], {self.post.id: 1})
+
+    def test_poll_database(self):
+        poll_database()
+        Post.objects.filter(id=self.post.id).touch(like_count=7)
+        poll_database()
+        self.assertEqual(hub.changes([self.post.id], 0)[0], {self.post.id: 7})
+
+    def stream(self, cookie, events, last_event_id=None):
+        scope = {'type': 'http', 'method': 'GET', 'path': reverse('network_life:live_likes'),
+                 'query_string': f'posts={self.post.id},x'.encode(),
+                 'headers': [(b'cookie', f'{settings.SESSION_COOKIE_NAME}={cookie}'.encode())]}
+        if last_event_id is not None:
+            scope['headers'].append((b'last-event-id', last_event_id.encode()))
+
+        async def run():
+            communicator = ApplicationCommunicator(live_likes(None), scope)
+            await communicator.send_input({'type': 'http.request'})
+            start = await communicator.receive_output(timeout=5)
+            bodies = []
+            for _ in range(events):
+                bodies.append((await communicator.receive_output(timeout=5))['body'].decode())
+                # a like from another process, picked up by the database poll
+                await asyncio.sleep(0.05)
+                await sync_to_async(Post.objects.filter(id=self.post.id).touch)(like_count=len(bodies))
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(timeout=5)
+            return start, bodies
+
+        return async_to_sync(run)()
+
+    @override_settings(LIVE_LIKES_INTERVAL=0.05)
+    def test_stream(self):
+        start, bodies = self.stream(self.client.cookies[settings.SESSION_COOKIE_NAME].value, 3)
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'Content-Type', b'text/event-stream'), start['headers'])
+        self.assertIn(f'event: likes\ndata: {{"{self.post.id}": 0}}', bodies[0])
+        self.assertIn(f'data: {{"{self.post.id}": 1}}', bodies[1])
+        self.assertIn(f'data: {{"{self.post.id}": 2}}', bodies[2])
+
+    @override_settings(LIVE_LIKES_INTERVAL=0.05)
+    def test_reconnect_to_another_process(self):
+        Post.objects.filter(id=self.post.id).update(like_count=4)
+        cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        # an id from a process that restarted since: the counts are sent again
+        start, bodies = self.stream(cookie, 1, last_event_id='0123456789ab-40')
+        self.assertIn(f'id: {hub.epoch}-', bodies[0])
+        self.assertIn(f'event: likes\ndata: {{"{self.post.id}": 4}}', bodies[0])
+
+    def test_stream_requires_login(self):
+        start, bodies = self.stream('missing', 1)
+        self.assertEqual(start['status'], 401)
+
+    def test_without_asgi(self):
+        self.assertEqual(self.client.get(reverse('network_life:live_likes')).status_code, 204)
+
+class TestRecommendations(TestCase):
+    def setUp(self):
+        self.users = {}
+        for name in 'abcdef':
+            user = User.objects.create_user(username=name, password=f'{name}password')
+            ProfilePage.objects.create(pk=user.pk, username=name)
+            self.users[name] = user
+        for follower, followees in {'a': 'bc', 'b': 'de', 'c': 'da', 'e': 'f'}.items():
+            for followee in followees:
+                Followers.objects.create(follower=self.users[follower], followee=self.users[followee])
+        recount_follows()
+
+    def refresh(self, *args):
+        out = StringIO()
+        call_command('refresh_recommendations', *args, stdout=out)
+        return out.getvalue()
+
+    def test_friends_of_friends(self):
+        graph = FollowGraph.load()
+        u = {name: user.id for name, user in self.users.items()}
+        self.assertEqual(graph.recommend(u['a'], 10), [(u['d'], 2), (u['e'], 1)])
+        self.assertEqual(graph.recommend(u['a'], 1), [(u['d'], 2)])
+        self.assertEqual(graph.recommend(u['b'], 10), [(u['f'], 1)])
+        self.assertEqual(graph.recommend(u['f'], 10), [])
+        # one sparse product for the batch, users outside the graph are left out
+        self.assertEqual(graph.recommend_batch([u['a'], u['b'], u['f'], 0], 10),
+                         {u['a']: [(u['d'], 2), (u['e'], 1)], u['b']: [(u['f'], 1)]})
+        self.assertEqual(sorted(graph.followers()), sorted(u[name] for name in 'abce'))
+
+    def test_refresh_and_show(self):
+        self.assertIn('for 4 users, 4 rows', self.refresh())
+        self.assertEqual(recommended_accounts(self.users['a']), [{'mutual': 2, 'username': 'd'},
+                                                                 {'mutual': 1, 'username': 'e'}])
+        # followed since the last run
+        Followers.objects.create(follower=self.users['a'], followee=self.users['d'])
+        self.assertEqual(recommended_accounts(self.users['a']), [{'mutual': 1, 'username': 'e'}])
+
+        client = Client()
+        client.login(username='a', password='apassword')
+        self.assertContains(client.get(reverse('network_life:home')), 'Who to follow')
+        self.assertContains(client.get(reverse('network_life:profile', kwargs={'username': 'a'})), 'Who to follow')
+        self.assertNotContains(client.get(reverse('network_life:profile', kwargs={'username': 'b'})), 'Who to follow')
+
+    def test_incremental_refresh(self):
+        self.refresh()
+        computed = dict(Recommendation.objects.values_list('user__username', 'computed_at').distinct())
+        # b's follows change: b and its follower a are recomputed, c and e are not
+        toggle_follow(self.users['b'], self.users['e'])
+        self.assertIn('for 2 users', self.refresh('--incremental'))
+        self.assertEqual(recommended_accounts(self.users['a']), [{'mutual': 2, 'username': 'd'}])
+        self.assertFalse(recommended_accounts(self.users['b']))
+        self.assertEqual(Recommendation.objects.get(user=self.users['c']).computed_at, computed['c'])
+        # nothing changed since
+        self.assertIn('for 0 users', self.refresh('--incremental'))
+
+@override_settings(TRENDING_HALF_LIFE=3600)
+class TestTrending(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='trender', password='trenderpassword')
+        ProfilePage.objects.create(pk=self.user.pk, username='trender')
+        self.posts = [Post.objects.create(user=self.user, name='trender', main_image='img', preview='img',
+                                          description=f'trending {i}', date_published=datetime.datetime.now())
+                      for i in range(3)]
+        self.fans = [User.objects.create_user(username=f'trend_fan{i}') for i in range(3)]
+
+    def scores(self):
+        return list(Post.objects.order_by('id').values_list('trending_score', flat=True))
+
+    def test_likes_change_score(self):
+        for fan in self.fans:
+            toggle_like(self.posts[1].id, fan)
+        toggle_like(self.posts[2].id, self.user)
+        self.assertEqual(self.scores(), [0, 3, 1])
+        toggle_like(self.posts[2].id, self.user)
+        self.assertEqual(self.scores(), [0, 3, 0])
+
+    def test_decay(self):
+        for fan in self.fans[:2]:
+            toggle_like(self.posts[0].id, fan)
+        toggle_like(self.posts[1].id, self.user)
+        self.assertEqual(decay(3600), 2)
+        self.assertEqual(self.scores(), [1, 0.5, 0])
+        # an unlike after the like lost its weight does not go negative
+        toggle_like(self.posts[1].id, self.user)
+        self.assertEqual(self.scores(), [1, 0, 0])
+        # faded likes leave the trending range
+        self.assertEqual(decay(5 * 3600), 0)
+        self.assertEqual(self.scores(), [0, 0, 0])
+
+    def test_unlike_takes_back_an_average_like(self):
+        for fan in self.fans[:2]:
+            toggle_like(self.posts[0].id, fan)
+        decay(3600)
+        # like, wait a half-life, unlike: the other likes are left at what they decayed to, not below
+        toggle_like(self.posts[0].id, self.user)
+        decay(3600)
+        self.assertEqual(self.scores()[0], 1)
+        toggle_like(self.posts[0].id, self.user)
+        self.assertAlmostEqual(self.scores()[0], 2 / 3)
+        self.assertGreaterEqual(self.scores()[0], 0.5)
+
+    def test_trending_page(self):
+        for post, fans in zip(self.posts, [self.fans[:1], self.fans, []]):
+            for fan in fans:
+                toggle_like(post.id, fan)
+        posts, cursor = trending_page(page_size=1)
+        self.assertEqual(posts, [self.posts[1]])
+        posts, cursor = trending_page(cursor, page_size=1)
+        self.assertEqual((posts, cursor), ([self.posts[0]], None))
+
+        client = Client()
+        client.login(username='trender', password='trenderpassword')
+        response = client.get(reverse('network_life:trending'))
+        self.assertEqual(response.context['posts'], [self.posts[1], self.posts[0]])
+
+    def test_top_n_reads_the_index(self):
+        posts = Post.objects.filter(trending_score__gt=0).order_by('-trending_score', '-id')[:20]
+        self.assertIn('post_trending_idx', posts.explain())
+
+    def test_decay_command(self):
+        toggle_like(self.posts[0].id, self.user)
+        # the first run only records the time
+        call_command('decay_trending', stdout=StringIO())
+        self.assertEqual(self.scores()[0], 1)
+
+        # decays by the time since the previous run, however long ago it was
+        TrendingDecay.objects.update(decayed_at=timezone.now() - datetime.timedelta(hours=2))
+        out = StringIO()
+        call_command('decay_trending', stdout=out)
+        self.assertIn('1 posts trending', out.getvalue())
+        self.assertAlmostEqual(self.scores()[0], 0.25, places=3)
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class TestUserImport(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def write(self, name, content):
+        path = os.path.join(self.folder.name, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_users', path, '--batch-size=2', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_and_resume(self):
+        path = self.write('users.csv', 'username,email,password,first_name,last_name,bio\n'
+                                       'ann,ann@example.com,annpassword,Ann,Lee,hello\n'
+                                       'bob,bob@example.com,bobpassword,Bob,,\n'
+                                       'bad name!,x@example.com,x,,,\n'
+                                       'ann,again@example.com,other,,,\n'
+                                       'cid,,,,,\n')
+        out, err = self.run_import(path, '--workers=1')
+        self.assertIn('Imported 3 users', out)
+        self.assertIn('1 skipped as existing or duplicate, 1 invalid', out)
+        self.assertIn('row 3:', err)
+
+        ann = User.objects.get(username='ann')
+        self.assertTrue(ann.check_password('annpassword'))
+        self.assertEqual(ann.email, 'ann@example.com')
+        profile = ProfilePage.objects.get(pk=ann.pk)
+        self.assertEqual((profile.username, profile.first_name, profile.second_name, profile.bio),
+                         ('ann', 'Ann', 'Lee', 'hello'))
+        self.assertFalse(User.objects.get(username='cid').has_usable_password())
+
+        # a second run finds everything in place
+        out, err = self.run_import(path, '--workers=1')
+        self.assertIn('Imported 0 users', out)
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_jsonl_import_on_process_pool(self):
+        User.objects.create_user(username='user1')
+        path = self.write('users.jsonl', ''.join(json.dumps({'username': f'user{i}', 'password': f'secret{i}'}) + '\n'
+                                                 for i in range(5)))
+        out, err = self.run_import(path, '--workers=2')
+        self.assertIn('Imported 4 users', out)
+        self.assertTrue(User.objects.get(username='user3').check_password('secret3'))
+        self.assertEqual(ProfilePage.objects.count(), 4)
+
+
+class TestRequestProfiler(TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.settings = override_settings(REQUEST_PROFILER=True, PROFILE_ROOT=self.folder.name,
+                                          PROFILE_MAX_REPORTS=2)
+        self.settings.enable()
+        self.user = User.objects.create_user(username='profiler', password='profilerpassword', is_staff=True)
+        ProfilePage.objects.create(pk=self.user.pk, username='profiler')
+        self.client = Client()
+        self.client.login(username='profiler', password='profilerpassword')
+
+    def tearDown(self):
+        self.settings.disable()
+        self.folder.cleanup()
+
+    def test_staff_request_is_profiled(self):
+        response = self.client.get(reverse('network_life:home'), {'profile': '1'})
+        name = response['X-Profile-Report']
+        report = ProfileStore(self.folder.name).meta(name)
+        self.assertEqual((report['view'], report['status'], report['user']), ('network_life:home', 200, 'profiler'))
+
+        stats = self.client.get(reverse('network_life:profile_report', args=[name]))
+        self.assertIn(b'function calls', stats.content)
+        collapsed = self.client.get(reverse('network_life:profile_report', args=[name]), {'format': 'collapsed'})
+        lines = collapsed.content.decode().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            self.assertRegex(line, r'^\S.* \d+$')
+        self.assertContains(self.client.get(reverse('network_life:profile_reports')), name)
+        self.assertEqual(self.client.get(reverse('network_life:profile_report', args=['missing'])).status_code, 404)
+
+    def test_only_requested_staff_requests(self):
+        self.assertNotIn('X-Profile-Report', self.client.get(reverse('network_life:home')))
+        self.user.is_staff = False
+        self.user.save()
+        response = self.client.get(reverse('network_life:home'), {'profile': '1'})
+        self.assertNotIn('X-Profile-Report', response)
+        self.assertEqual(ProfileStore(self.folder.name).names(), [])
+        self.assertEqual(self.client.get(reverse('network_life:profile_reports')).status_code, 302)
+
+    def test_report_names(self):
+        store = ProfileStore(self.folder.name)
+        self.assertEqual(store.path('1-home-abc'), os.path.join(self.folder.name, '1-home-abc.prof'))
+        for name in ('1-home-abc\n', '../secret', ''):
+            with self.assertRaises(FileNotFoundError):
+                store.path(name)
+
+    @override_settings(REQUEST_PROFILER=False)
+    def test_disabled(self):
+        client = Client()
+        client.force_login(self.user)
+        self.assertNotIn('X-Profile-Report', client.get(reverse('network_life:home'), {'profile': '1'}))
+        self.assertEqual(ProfileStore(self.folder.name).names(), [])
+
+    def test_ring_buffer(self):
+        names = [self.client.get(reverse('network_life:home'), HTTP_X_PROFILE='1')['X-Profile-Report']
+                 for _ in range(3)]
+        self.assertEqual(ProfileStore(self.folder.name).names(), sorted(names)[1:])
@@ -0,0 +1,135 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+
+DEFAULT_VARIANTS = {
+    # name: widths generated for it (1x and 2x screens)
+    'feed': [600, 1200],
+    'grid': [300, 600],
+    'avatar': [32, 64],
+}
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 4}),
+           'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True})}
+DEFAULT_CACHE_TIMEOUT = 300
+
+
+def get_variants():
+    return getattr(settings, 'THUMBNAIL_VARIANTS', DEFAULT_VARIANTS)
+
+
+def get_root():
+    return str(getattr(settings, 'THUMBNAIL_ROOT', os.path.join(settings.BASE_DIR, 'thumbnails')))
+
+
+def thumbnail_name(public_id, width, ext):
+    return f'{public_id}_{width}.{ext}'
+
+
+def manifest_name(public_id):
+    # the width of the source, the thumbnails are never wider than it
+    return f'{public_id}.json'
+
+
+def source_cache_key(public_id):
+    return f'network_life:thumbnail:{public_id}'
+
+
+def real_widths(widths, source_width):
+    """Variant widths capped at the source width, an image is never scaled up."""
+    return sorted({min(width, source_width) for width in widths})
+
+
+def make_thumbnails(source, public_id, root=None, variants=None):
+    """
+    Write every variant width of an image as WebP and JPEG under root.
+
+    JPEG sources are decoded in draft mode at the smallest DCT scale that is
+    still larger than the biggest variant, which skips most of the decoding
+    work for large photos. A variant wider than the source is written at the
+    source width. The source width goes to a manifest next to the thumbnails,
+    srcset() reads it to know which files exist. Returns the list of written
+    paths.
+    """
+    root = root or get_root()
+    widths = sorted({width for sizes in (variants or get_variants()).values() for width in sizes}, reverse=True)
+    written = []
+
+    with Image.open(source) as image:
+        source_width = image.width
+        if image.format == 'JPEG':
+            image.draft('RGB', (widths[0], widths[0] * image.height // image.width))
+        image = image.convert('RGB')
+
+        for width in real_widths(widths, source_width):
+            if width < image.width:
+                resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            else:
+                resized = image
+            for ext, (fmt, options) in FORMATS.items():
+                path = os.path.join(root, thumbnail_name(public_id, width, ext))
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                resized.save(path, fmt, **options)
+                written.append(path)
+
+    with open(os.path.join(root, manifest_name(public_id)), 'w') as manifest:
+        json.dump({'width': source_width}, manifest)
+    cache.delete(source_cache_key(public_id))
+    return written
+
+
+def _make_thumbnails(job):
+    source, public_id, root, variants = job
+    try:
+        return len(make_thumbnails(source, public_id, root, variants))
+    except (OSError, ValueError):
+        # unreadable or non-image file, skip it
+        return 0
+
+
+def generate_thumbnails(jobs, workers=None, root=None, variants=None):
+    """Make thumbnails for [(source, public_id), ...] across a process pool, returns files written."""
+    root, variants = root or get_root(), variants or get_variants()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return sum(pool.map(_make_thumbnails, [(source, public_id, root, variants) for source, public_id in jobs],
+                            chunksize=8))
+
+
+def local_source_width(public_id):
+    """
+    Width of the source of the local thumbnails of an image, 0 when there are
+    none. Read from the manifest once and then served from the cache, not
+    looked up on disk for every srcset of every render.
+    """
+    key = source_cache_key(public_id)
+    width = cache.get(key)
+    if width is None:
+        try:
+            with open(os.path.join(get_root(), manifest_name(public_id))) as manifest:
+                width = json.load(manifest)['width']
+        except (OSError, ValueError, KeyError):
+            width = 0
+        cache.set(key, width, getattr(settings, 'THUMBNAIL_CACHE_TIMEOUT', DEFAULT_CACHE_TIMEOUT))
+    return width
+
+
+def srcset(resource, variant, ext='jpg'):
+    """
+    srcset for a CloudinaryResource: local thumbnails if they were generated,
+    advertised at their real widths, otherwise Cloudinary URLs resized on its
+    CDN to the variant widths.
+    """
+    if not resource or not getattr(resource, 'public_id', None):
+        return ''
+    widths = get_variants()[variant]
+    source_width = local_source_width(resource.public_id)
+    if source_width:
+        base = getattr(settings, 'THUMBNAIL_URL', '/thumbnails/')
+        widths = real_widths(widths, source_width)
+        urls = [base + thumbnail_name(resource.public_id, width, ext) for width in widths]
+    else:
+        urls = [resource.build_url(width=width, crop='scale', quality='auto', format=ext) for width in widths]
+    return ', '.join(f'{url} {width}w' for url, width in zip(urls, widths))
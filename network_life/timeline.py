@@ -0,0 +1,109 @@
+from django.conf import settings
+from django.db.models import Exists
+
+from .models import ProfilePage, Post, Followers, TimelineEntry
+from .pagination import paginate_posts, encode_cursor
+
+DEFAULT_FANOUT_LIMIT = 5000
+DEFAULT_BACKFILL = 50
+
+
+def fanout_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_LIMIT', DEFAULT_FANOUT_LIMIT)
+
+
+def big_account(user_id):
+    # ProfilePage.followers_count decides both sides, so a post is always either pushed or merged in at read time
+    return ProfilePage.objects.filter(pk=user_id, followers_count__gt=fanout_limit())
+
+
+def fan_out_post(post):
+    """
+    Push a new post into the timelines of its author and the author's followers.
+
+    Accounts with more than TIMELINE_FANOUT_LIMIT followers are skipped (except
+    for the author's own timeline); their posts are merged in at read time.
+    """
+    # no followers at all for a big account, checked in the same query
+    follower_ids = (Followers.objects.filter(~Exists(big_account(post.user_id)), followee_id=post.user_id)
+                    .values_list('follower_id', flat=True))
+
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=owner_id, post_id=post.id, author_id=post.user_id, date_published=post.date_published)
+         for owner_id in {post.user_id, *follower_ids}],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+def latest_posts(followee_id):
+    return list(Post.objects.filter(user_id=followee_id).order_by('-date_published', '-id')
+                .values_list('id', 'user_id', 'date_published')[:getattr(settings, 'TIMELINE_BACKFILL',
+                                                                         DEFAULT_BACKFILL)])
+
+
+def backfill_timeline(user, followee):
+    # copy the latest posts of a freshly followed account into the follower's timeline
+    if big_account(followee.id).exists():
+        return
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=user.id, post_id=post_id, author_id=author_id, date_published=date_published)
+         for post_id, author_id, date_published in latest_posts(followee.id)],
+        ignore_conflicts=True,
+    )
+
+
+def backfill_followers(followee, chunk_size=1000):
+    """
+    Copy the latest posts of an account into the timelines of all its followers.
+
+    For an account that just dropped to TIMELINE_FANOUT_LIMIT followers: its
+    posts from when it was bigger were never pushed and are no longer merged
+    in at read time.
+    """
+    posts = latest_posts(followee.id)
+    if not posts:
+        return
+    follower_ids = list(Followers.objects.filter(followee=followee).values_list('follower_id', flat=True))
+    for start in range(0, len(follower_ids), chunk_size):
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(owner_id=owner_id, post_id=post_id, author_id=author_id, date_published=date_published)
+             for owner_id in follower_ids[start:start + chunk_size] for post_id, author_id, date_published in posts],
+            batch_size=1000, ignore_conflicts=True,
+        )
+
+
+def drop_from_timeline(user, followee):
+    TimelineEntry.objects.filter(owner=user, author=followee).delete()
+    # the unfollow that takes an account back down to the limit switches it to fan-out on write
+    if ProfilePage.objects.filter(pk=followee.id, followers_count=fanout_limit()).exists():
+        backfill_followers(followee)
+
+
+def timeline_page(user, cursor=None, page_size=20):
+    """
+    One page of user's "following" timeline, returns (posts, next_cursor).
+
+    Pushed posts come from a range scan of the owner's timeline index; posts of
+    followed accounts too big to fan out are read from the Post index and merged in.
+    """
+    entries, entries_cursor = paginate_posts(TimelineEntry.objects.filter(owner=user), cursor, page_size, 'post_id')
+    rows = [(entry.date_published, entry.post_id) for entry in entries]
+
+    big_accounts = list(
+        ProfilePage.objects.filter(username__in=Followers.objects.filter(follower=user).values('followee__username'),
+                                   followers_count__gt=fanout_limit())
+        .values_list('username', flat=True)
+    )
+    pulled_cursor = None
+    if big_accounts:
+        pulled, pulled_cursor = paginate_posts(Post.objects.filter(name__in=big_accounts).only('id', 'date_published'),
+                                               cursor, page_size)
+        rows = sorted({*rows, *((post.date_published, post.id) for post in pulled)}, reverse=True)
+
+    next_cursor = None
+    if len(rows) > page_size or entries_cursor or pulled_cursor:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(*rows[-1])
+
+    posts = Post.objects.with_card_data().in_bulk([post_id for _, post_id in rows])
+    return [posts[post_id] for _, post_id in rows if post_id in posts], next_cursor
@@ -0,0 +1,101 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Post, TrendingDecay
+
+DEFAULT_HALF_LIFE = 6 * 3600
+DEFAULT_DECAY_INTERVAL = 600
+# decayed below this a post leaves the trending range of the index
+MIN_SCORE = 0.05
+
+
+def score_change(delta):
+    """
+    touch() value for Post.trending_score when delta likes were added (or
+    removed), next to like_count=F('like_count') + delta: a like adds 1,
+    decayed by decay() afterwards.
+
+    When it was added is not stored, so an unlike takes back what a like of
+    the post is worth on average, score / like_count (the like_count before
+    the update), rather than a full 1. Liking, waiting and unliking never
+    takes away more than the likes of others would have decayed anyway.
+    """
+    if delta >= 0:
+        return F('trending_score') + float(delta)
+    zero = Value(0.0, output_field=FloatField())
+    # like_count is an integer, the float score is multiplied first so the division isn't an integer one
+    return Greatest(F('trending_score') * Greatest(F('like_count') + delta, 0) / Greatest(F('like_count'), 1), zero)
+
+
+def decay(elapsed):
+    """
+    Let elapsed seconds pass for every trending post, returns the number of
+    posts still trending. A like is worth half as much after TRENDING_HALF_LIFE
+    seconds. Only the rows with a score are touched, both updates read the
+    trending index range.
+    """
+    factor = 0.5 ** (elapsed / getattr(settings, 'TRENDING_HALF_LIFE', DEFAULT_HALF_LIFE))
+    Post.objects.filter(trending_score__gt=0, trending_score__lt=MIN_SCORE / factor).update(trending_score=0)
+    return Post.objects.filter(trending_score__gt=0).update(trending_score=F('trending_score') * factor)
+
+
+def decay_since_last_pass():
+    """
+    Decay by the time that passed since the previous pass, recorded in
+    TrendingDecay, so a skipped or repeated run still decays every score by
+    the real elapsed time. Returns (elapsed seconds, posts trending), or None
+    when another pass ran at the same time. The first pass only records when
+    the next one starts.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        state, created = TrendingDecay.objects.get_or_create(pk=1, defaults={'decayed_at': now})
+        if created:
+            return 0.0, Post.objects.filter(trending_score__gt=0).count()
+        elapsed = (now - state.decayed_at).total_seconds()
+        # claimed with a conditional update, a concurrent pass finds the time already moved on
+        if elapsed <= 0 or not TrendingDecay.objects.filter(pk=1, decayed_at=state.decayed_at).update(decayed_at=now):
+            return None
+        return elapsed, decay(elapsed)
+
+
+def encode_cursor(score, post_id):
+    # the last post of the page: "<trending_score>|<id>"
+    return base64.urlsafe_b64encode(f'{score!r}|{post_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (trending_score, id) for a cursor or None if it can't be parsed."""
+    if not cursor:
+        return None
+    try:
+        score, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+        return float(score), int(post_id)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def trending_page(cursor=None, page_size=20):
+    """
+    Posts by trending score, keyset paginated like paginate_posts: a page is
+    one range read of post_trending_idx. Scores keep changing, so a post can
+    move past the cursor between two pages. Returns (posts, next_cursor).
+    """
+    queryset = Post.objects.with_card_data().filter(trending_score__gt=0).order_by('-trending_score', '-id')
+    position = decode_cursor(cursor)
+    if position is not None:
+        score, post_id = position
+        queryset = queryset.filter(Q(trending_score__lt=score) | Q(trending_score=score, id__lt=post_id))
+
+    posts = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(posts) > page_size:
+        posts = posts[:page_size]
+        next_cursor = encode_cursor(posts[-1].trending_score, posts[-1].id)
+    return posts, next_cursor
@@ -0,0 +1,96 @@
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from cloudinary import uploader
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .thumbnails import make_thumbnails
+
+DEFAULT_STORAGE = 'network_life.uploads.CloudinaryStorage'
+DEFAULT_MAX_WORKERS = 4
+
+
+class CloudinaryStorage:
+    """Uploads like CloudinaryField.pre_save does, with the field's own upload options."""
+
+    def upload(self, file, field):
+        options = {'type': field.type, 'resource_type': field.resource_type, **field.options}
+        if hasattr(file, 'seekable') and file.seekable():
+            file.seek(0)
+        return uploader.upload_resource(file, **options)
+
+    def delete(self, resource, field):
+        uploader.destroy(resource.public_id, type=field.type, resource_type=field.resource_type)
+
+
+class LocalStorage:
+    """
+    Writes files under LOCAL_UPLOAD_ROOT, a stand-in for Cloudinary in tests and
+    local runs. Images get their thumbnail variants generated right away.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or getattr(settings, 'LOCAL_UPLOAD_ROOT', os.path.join(settings.BASE_DIR, 'uploads'))
+
+    def upload(self, file, field):
+        folder = field.options.get('folder', '').strip('/')
+        name = f'{uuid.uuid4().hex}{os.path.splitext(file.name)[1]}'
+        os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+        path = os.path.join(self.root, folder, name)
+        with open(path, 'wb') as out:
+            for chunk in file.chunks():
+                out.write(chunk)
+        resource = field.parse_cloudinary_resource(f'{folder}/{name}' if folder else name)
+        if field.resource_type == 'image':
+            try:
+                make_thumbnails(path, resource.public_id)
+            except (OSError, ValueError):
+                # not an image Pillow can read, served without thumbnails
+                pass
+        return resource
+
+    def delete(self, resource, field):
+        try:
+            os.remove(os.path.join(self.root, f'{resource.public_id}.{resource.format}'))
+        except FileNotFoundError:
+            pass
+
+
+def get_storage():
+    return import_string(getattr(settings, 'IMAGE_STORAGE', DEFAULT_STORAGE))()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # shared by all requests, so UPLOAD_MAX_WORKERS bounds uploads process-wide
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'UPLOAD_MAX_WORKERS', DEFAULT_MAX_WORKERS),
+                                           thread_name_prefix='upload')
+        return _executor
+
+
+def upload_files(uploads, storage=None):
+    """
+    Upload [(file, field), ...] concurrently, returns the stored values in the same order.
+
+    The values can be assigned to the fields directly; CloudinaryField won't
+    upload them again on save.
+    """
+    storage = storage or get_storage()
+    futures = [get_executor().submit(storage.upload, file, field) for file, field in uploads]
+    return [future.result() for future in futures]
+
+
+def delete_files(uploaded, storage=None):
+    """Delete [(value, field), ...] returned by upload_files, when what they were uploaded for wasn't saved."""
+    storage = storage or get_storage()
+    for future in [get_executor().submit(storage.delete, value, field) for value, field in uploaded]:
+        future.result()
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, api
 from django.conf.urls.static import static
 from django.conf import settings
 
@@ -7,6 +7,10 @@ app_name = 'network_life'
 
 urlpatterns = [
     path('', views.home, name='home'),
+    path('following/', views.following_feed, name='following_feed'),
+    path('trending/', views.trending, name='trending'),
+    path('tag/<str:slug>', views.tag_feed, name='tag_feed'),
+    path('search/', views.search, name='search'),
     path('liked/<int:post_id>', views.like_unlike_post, name='like-post-view'),
     path('register/', views.register_page, name='register'),
     path('login/', views.login_page, name='login'),
@@ -20,6 +24,15 @@ urlpatterns = [
     path("follow/<str:follower>/<str:user>", views.follow, name='follow'),
     path('following_accounts/<str:username>', views.following_accounts, name='following_accounts'),
     path('followers_accounts/<str:username>', views.followers_accounts, name='followers_accounts'),
+    path('stats/requests', views.request_stats_view, name='request_stats'),
+    path('stats/fragments', views.fragment_stats_view, name='fragment_stats'),
+    path('stats/profiles', views.profile_reports_view, name='profile_reports'),
+    path('stats/profiles/<str:name>', views.profile_report_view, name='profile_report'),
+    path('api/feed', api.feed, name='api_feed'),
+    path('api/profile/<str:username>/posts', api.profile_posts, name='api_profile_posts'),
+    path('api/post/<int:id>', api.post, name='api_post'),
+    path('api/likes', api.likes, name='api_likes'),
+    path('live/likes', views.live_likes, name='live_likes'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -0,0 +1,145 @@
+import csv
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ProfilePage
+
+# ids per IN (...) list, below SQLite's bound parameter limit
+LOOKUP_SIZE = 500
+
+
+def read_rows(path):
+    """Dicts of a .csv file (with a header) or a .jsonl file (one object per line), streamed."""
+    with open(path, newline='', encoding='utf-8') as file:
+        if os.path.splitext(path)[1].lower() == '.csv':
+            yield from csv.DictReader(file)
+        else:
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def clean_row(row):
+    """The fields of one import row, raises ValidationError if the username is unusable."""
+    username = (row.get('username') or '').strip()
+    if not username or len(username) > 150:
+        raise ValidationError(f'Invalid username {username!r}')
+    UnicodeUsernameValidator()(username)
+    return {
+        'username': username,
+        'email': (row.get('email') or '').strip(),
+        # no password gives an unusable one, the user has to reset it
+        'password': row.get('password') or None,
+        'first_name': (row.get('first_name') or '')[:50],
+        'last_name': (row.get('last_name') or row.get('second_name') or '')[:50],
+        'bio': row.get('bio') or '',
+    }
+
+
+def user_ids(usernames):
+    """{username: id} of the usernames that exist."""
+    ids = {}
+    for start in range(0, len(usernames), LOOKUP_SIZE):
+        ids.update(User.objects.filter(username__in=usernames[start:start + LOOKUP_SIZE]).values_list('username', 'id'))
+    return ids
+
+
+def init_worker():
+    # a spawned worker starts without the app registry
+    django.setup()
+
+
+class UserImport:
+    """
+    Creates a User and a ProfilePage for every row, batch_size rows per
+    transaction.
+
+    Passwords are hashed on a process pool, while the previous batch is
+    written. Usernames that already exist are skipped before hashing, so an
+    interrupted import is resumed by running it again on the same file.
+    """
+
+    def __init__(self, workers=1, batch_size=1000):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.seen = set()
+        self.imported = self.skipped = 0
+        self.errors = []
+
+    def new_rows(self, rows):
+        for number, row in enumerate(rows, 1):
+            try:
+                row = clean_row(row)
+            except (ValidationError, AttributeError) as error:
+                self.errors.append(f'row {number}: {"; ".join(getattr(error, "messages", [str(error)]))}')
+                continue
+            # duplicates within the file
+            if row['username'] in self.seen:
+                self.skipped += 1
+                continue
+            self.seen.add(row['username'])
+            yield row
+
+    def batches(self, rows):
+        iterator = self.new_rows(rows)
+        while batch := list(itertools.islice(iterator, self.batch_size)):
+            usernames = [row['username'] for row in batch]
+            # a profile left behind by a deleted user holds on to its username too
+            existing = set(user_ids(usernames)).union(*(
+                ProfilePage.objects.filter(username__in=usernames[start:start + LOOKUP_SIZE])
+                .values_list('username', flat=True) for start in range(0, len(usernames), LOOKUP_SIZE)))
+            self.skipped += len(existing)
+            batch = [row for row in batch if row['username'] not in existing]
+            if batch:
+                yield batch
+
+    def hashed_batches(self, executor, rows):
+        # the pool hashes the next batch while the caller writes this one
+        pending = None
+        for batch in self.batches(rows):
+            passwords = [row['password'] for row in batch]
+            if executor is None:
+                hashes = map(make_password, passwords)
+            else:
+                hashes = executor.map(make_password, passwords, chunksize=max(1, len(batch) // (self.workers * 4)))
+            if pending is not None:
+                yield pending[0], list(pending[1])
+            pending = batch, hashes
+        if pending is not None:
+            yield pending[0], list(pending[1])
+
+    def write(self, batch, hashes):
+        now = timezone.now()
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=row['username'], email=row['email'], password=password, first_name=row['first_name'],
+                     last_name=row['last_name'], date_joined=now)
+                for row, password in zip(batch, hashes)
+            ])
+            ids = user_ids([row['username'] for row in batch])
+            # same primary key as the user, profiles are looked up by the user's pk
+            ProfilePage.objects.bulk_create([
+                ProfilePage(pk=ids[row['username']], username=row['username'], first_name=row['first_name'],
+                            second_name=row['last_name'], bio=row['bio'], register_date=now)
+                for row in batch
+            ])
+        self.imported += len(batch)
+
+    def run(self, rows):
+        """Import rows, yields after every written batch for progress reports."""
+        pool = ProcessPoolExecutor(self.workers, initializer=init_worker) if self.workers > 1 else nullcontext()
+        with pool as executor:
+            for batch, hashes in self.hashed_batches(executor, rows):
+                self.write(batch, hashes)
+                yield self
@@ -1,32 +1,116 @@
 import datetime
+import io
 
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.contrib.auth.decorators import login_required
+from django.contrib.auth.models import User
 from django.contrib.sites.shortcuts import get_current_site
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.mail import EmailMultiAlternatives
-from django.http import HttpResponse, JsonResponse
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, JsonResponse, Http404
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
 from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from taggit.models import Tag
 
+from .conditional import home_etag, profile_etag
+from .context_processors import invalidate_profile
+from .follows import toggle_follow
+from .fragments import fragment_stats
 from .forms import PostForm, CreateUserForm, ImageForm, ProfilePageForm
+from .likes import toggle_like
+from .middleware import request_stats
+from .outbox import queue_email
 from .models import ProfilePage, Post, Image, Followers
+from .pagination import paginate_posts, get_page_size
+from .profiling import ProfileStore, collapsed_stacks, profile_root
+from .recommendations import recommended_accounts
+from .search import search_posts, search_profiles
+from .tags import tag_index, invalidate_tag_index, tagged_posts
+from .timeline import fan_out_post, backfill_timeline, drop_from_timeline, timeline_page
+from .trending import trending_page
 from .tokens import account_activation_token
+from .uploads import delete_files, upload_files
 
 LOGIN_PAGE_URL = 'network_life:login'
 HOME_PAGE_URL = 'network_life:home'
 
 
 @login_required(login_url=LOGIN_PAGE_URL)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=home_etag)
 def home(request):
-    posts = Post.objects.all()[::-1]
-    avatar = ProfilePage.objects.get(pk=request.user.id)
-    tags = Tag.objects.all()
+    posts, next_cursor = paginate_posts(Post.objects.with_card_data(), request.GET.get('cursor'), get_page_size(request))
 
-    context = {'posts': posts, 'avatar': avatar.avatar, 'tags': tags}
+    # "load more" from bundle.js asks only for the next batch of cards
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        html = render_to_string('post_cards.html', {'posts': posts}, request=request)
+        return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+    context = {'posts': posts, 'next_cursor': next_cursor, 'tag_index': tag_index(),
+               'recommendations': recommended_accounts(request.user)}
+    return render(request, 'home.html', context)
+
+
+@login_required(login_url=LOGIN_PAGE_URL)
+def tag_feed(request, slug):
+    tag = get_object_or_404(Tag, slug=slug)
+    posts, next_cursor = paginate_posts(tagged_posts(tag).with_card_data(), request.GET.get('cursor'),
+                                        get_page_size(request))
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        html = render_to_string('post_cards.html', {'posts': posts}, request=request)
+        return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+    context = {'posts': posts, 'next_cursor': next_cursor, 'tag': tag, 'tag_index': tag_index()}
+    return render(request, 'home.html', context)
+
+
+@login_required(login_url=LOGIN_PAGE_URL)
+def trending(request):
+    posts, next_cursor = trending_page(request.GET.get('cursor'), get_page_size(request))
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        html = render_to_string('post_cards.html', {'posts': posts}, request=request)
+        return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+    context = {'posts': posts, 'next_cursor': next_cursor, 'trending': True}
+    return render(request, 'home.html', context)
+
+
+@login_required(login_url=LOGIN_PAGE_URL)
+def following_feed(request):
+    posts, next_cursor = timeline_page(request.user, request.GET.get('cursor'), get_page_size(request))
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        html = render_to_string('post_cards.html', {'posts': posts}, request=request)
+        return JsonResponse({'html': html, 'next_cursor': next_cursor})
+
+    context = {'posts': posts, 'next_cursor': next_cursor}
+    return render(request, 'home.html', context)
+
+
+@login_required(login_url=LOGIN_PAGE_URL)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    # the "load more" cursor of search results is the next page number
+    try:
+        page = max(1, int(request.GET.get('cursor', 1)))
+    except ValueError:
+        page = 1
+    posts, next_page = search_posts(query, page, get_page_size(request))
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        html = render_to_string('post_cards.html', {'posts': posts}, request=request)
+        return JsonResponse({'html': html, 'next_cursor': next_page})
+
+    context = {'posts': posts, 'next_cursor': next_page, 'query': query, 'profiles': search_profiles(query)}
     return render(request, 'home.html', context)
 
 
@@ -34,37 +118,26 @@ def home(request):
 def like_unlike_post(request, post_id):
     if request.method == 'POST':
         if request.headers.get('x-requested-with') == 'XMLHttpRequest':
-            post = get_object_or_404(Post, id=post_id)
+            try:
+                liked, like_count = toggle_like(post_id, request.user)
+            except Post.DoesNotExist:
+                raise Http404('Post does not exist')
 
-            if post.likes.filter(id=request.user.id).exists():
-                post.likes.remove(request.user)
-                liked = False
-            else:
-                post.likes.add(request.user)
-                liked = True
-
-            posts = Post.objects.filter(id=request.POST.get('post_id'), user=request.user)
-            for el in posts:
-                data = {
-                    'value': liked,
-                    'amount_likes': el.likes.count()
-                }
-                return JsonResponse(data)
+            data = {
+                'value': liked,
+                'amount_likes': like_count
+            }
+            return JsonResponse(data)
 
     return redirect(HOME_PAGE_URL)
 
 
 @login_required(login_url=LOGIN_PAGE_URL)
 def post(request, id):
-    product = Post.objects.get(id=id)
-    images = Image.objects.filter(post=product)
-    post = Post.objects.get(id=id)
-
-    avatar = ProfilePage.objects.get(pk=request.user.id)
+    post = get_object_or_404(Post.objects.with_card_data(), id=id)
+    images = Image.objects.filter(post=post)
 
-    tags = Tag.objects.all()
-
-    context = {'post': post, 'images': images, 'main_image': product.main_image, 'avatar': avatar.avatar, 'tags': tags}
+    context = {'post': post, 'images': images, 'main_image': post.main_image}
     return render(request, 'post.html', context)
 
 
@@ -79,21 +152,38 @@ def create_post(request):
         post_form = PostForm(request.POST, request.FILES)
         if post_form.is_valid():
             post = post_form.save(commit=False)
-            post.user = request.user
-            post.name = request.user.username
-            post.preview = post.main_image
-            post.date_published = datetime.datetime.now()
-            post.save()
-            post_form.save_m2m()
-            messages.success(request, 'Post created successfully')
 
-            for file in files:
-                Image.objects.create(post=post, images=file)
+            # upload the main image, its preview (the preview field's own folder and resize) and all extra images
+            # at once instead of one after another. The preview gets its own copy, the uploads run in parallel
+            main_file = post.main_image
+            preview_file = SimpleUploadedFile(main_file.name, main_file.read(), main_file.content_type)
+            main_file.seek(0)
+            uploads = [(main_file, Post._meta.get_field('main_image')), (preview_file, Post._meta.get_field('preview'))]
+            uploads += [(f, Image._meta.get_field('images')) for f in files]
+            uploaded = upload_files(uploads)
+            main_image, preview, *images = uploaded
+
+            try:
+                with transaction.atomic():
+                    post.user = request.user
+                    post.name = request.user.username
+                    post.main_image = main_image
+                    post.preview = preview
+                    post.date_published = datetime.datetime.now()
+                    post.save()
+                    post_form.save_m2m()
+                    fan_out_post(post)
+                    Image.objects.bulk_create([Image(post=post, images=image) for image in images])
+            except Exception:
+                # nothing refers to the uploads now
+                delete_files([(value, field) for value, (file, field) in zip(uploaded, uploads)])
+                raise
+            invalidate_tag_index()
+            messages.success(request, 'Post created successfully')
 
             return redirect(HOME_PAGE_URL)
 
-    avatar = ProfilePage.objects.get(pk=request.user.id)
-    context = {'p_form': post_form, 'i_form': image_form, 'avatar': avatar.avatar}
+    context = {'p_form': post_form, 'i_form': image_form}
     return render(request, 'create.html', context)
 
 
@@ -120,7 +210,8 @@ def register_page(request):
             to_email = form.cleaned_data.get('email')  # get email address on what send confirmation letter
             email = EmailMultiAlternatives(mail_subject, message, to=[to_email])
             email.attach_alternative(message, 'text/html')
-            email.send()
+            # sent by the send_outbox worker, not in the request
+            queue_email(email)
             messages.info(request, f'Please confirm your email address to complete the registration')
             return render(request, 'registration/register.html', {'form': form})
     else:
@@ -181,29 +272,30 @@ def activate(request, uidb64, token):
 
 
 @login_required(login_url=LOGIN_PAGE_URL)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    # get all posts
-    posts = Post.objects.filter(name=username).all()[::-1]
+    # get all posts, only the columns the preview grid needs
+    posts = list(Post.objects.filter(name=username).only('id', 'preview').order_by('-date_published', '-id'))
     # get some data from ProfilePage Table
     data = ProfilePage.objects.get(username=username)
 
     # get data from Follower Table by a username
-    if Followers.objects.filter(user=request.user, follow_to=username, username=request.user.username).first():
+    if Followers.objects.filter(follower=request.user, followee__username=username).exists():
         text = 'Unfollow'
     else:
         text = 'Follow'
 
-    followers_amount = len(Followers.objects.filter(username=username))
-    following_amount = len(Followers.objects.filter(follow_to=username))
-
     context = {
         'posts': posts,
-        'avatar': data.avatar,
+        'profile_avatar': data.avatar,
         'username': data.username,
         'amount_posts': len(posts),
         'button_text': text,
-        'followers_amount': followers_amount,
-        'following_amount': following_amount,
+        'followers_amount': data.followers_count,
+        'following_amount': data.following_count,
+        # "who to follow" on the user's own profile
+        'recommendations': recommended_accounts(request.user) if request.user.username == username else [],
     }
     return render(request, 'profile.html', context)
 
@@ -216,53 +308,98 @@ def update_profile(request):
         form = ProfilePageForm(request.POST, request.FILES, instance=obj)
         if form.is_valid():
             form.save()
+            invalidate_profile(obj.pk)
             messages.success(request, 'Your profile was successfully updated!')
             return redirect(f'/profile/{username}')
     else:
         form = ProfilePageForm(instance=obj)
 
-    avatar = ProfilePage.objects.get(pk=request.user.id)
-    context = {'form': form, 'avatar': avatar.avatar, 'current_user': username}
+    context = {'form': form, 'current_user': username}
     return render(request, 'update_profile.html', context)
 
 
 @login_required(login_url=LOGIN_PAGE_URL)
 def follow(request, follower, user):
     if request.method == 'POST':
+        followee = get_object_or_404(User, username=follower)
         # if you already FOLLOW and want more,-> then delete
-        if Followers.objects.filter(user=request.user, follow_to=follower, username=user).first():
-            delete_follower = Followers.objects.get(user=request.user, follow_to=follower, username=user)
-            delete_follower.delete()
+        if not toggle_follow(request.user, followee):
+            drop_from_timeline(request.user, followee)
             messages.success(request, f'You have just unfollowed from {follower}')
-            return redirect(f'/profile/{follower}')
+            return redirect('network_life:profile', follower)
 
         # if for the first time
         else:
-            new_follower = Followers.objects.create(user=request.user, follow_to=follower, username=user)
-            new_follower.save()
+            backfill_timeline(request.user, followee)
             messages.success(request, f'You have just followed with {follower}')
-            return redirect(f'/profile/{follower}')
+            return redirect('network_life:profile', follower)
     else:
         return redirect(HOME_PAGE_URL)
 
 
 @login_required(login_url=LOGIN_PAGE_URL)
 def following_accounts(request, username):
-    data = ProfilePage.objects.get(username=username)
-    following = Followers.objects.filter(username=username).all()
+    following = Followers.objects.filter(follower__username=username).select_related('followee')
     context = {
         'following': following,
-        'avatar': data.avatar,
     }
     return render(request, 'following_accounts.html', context)
 
 
 @login_required(login_url=LOGIN_PAGE_URL)
 def followers_accounts(request, username):
-    data = ProfilePage.objects.get(username=username)
-    followers = Followers.objects.filter(follow_to=username).all()
+    followers = Followers.objects.filter(followee__username=username).select_related('follower')
     context = {
         'followers': followers,
-        'avatar': data.avatar,
     }
     return render(request, 'followers_accounts.html', context)
+
+
+@staff_member_required
+def request_stats_view(request):
+    # per URL name numbers collected by RequestMetricsMiddleware in this process
+    if request.method == 'POST':
+        request_stats.reset()
+    return JsonResponse(request_stats.snapshot())
+
+
+@staff_member_required
+def fragment_stats_view(request):
+    # post card / post page fragment cache hit rates of this process
+    if request.method == 'POST':
+        fragment_stats.reset()
+    return JsonResponse(fragment_stats.snapshot())
+
+
+@staff_member_required
+def profile_reports_view(request):
+    # requests run under the profiler (?profile=1), newest first
+    reports = [{**report, 'time': datetime.datetime.fromtimestamp(report['timestamp'], datetime.timezone.utc)}
+               for report in ProfileStore(profile_root()).reports()]
+    return render(request, 'profiles.html', {'reports': reports})
+
+
+@staff_member_required
+def profile_report_view(request, name):
+    # the top functions as text, ?format=collapsed for flame graph tools, ?format=prof for pstats / snakeviz
+    store = ProfileStore(profile_root())
+    output = io.StringIO()
+    try:
+        if request.GET.get('format') == 'prof':
+            return FileResponse(open(store.path(name), 'rb'), as_attachment=True, filename=f'{name}.prof')
+        stats = store.stats(name, stream=output)
+    except FileNotFoundError:
+        raise Http404('No such profile report')
+
+    if request.GET.get('format') == 'collapsed':
+        response = HttpResponse(collapsed_stacks(stats), content_type='text/plain; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{name}.folded"'
+        return response
+    stats.sort_stats('cumulative').print_stats(60)
+    return HttpResponse(output.getvalue(), content_type='text/plain; charset=utf-8')
+
+
+def live_likes(request):
+    # the like count stream is served by the ASGI application (network_life.live),
+    # a 204 tells EventSource not to reconnect when running under WSGI
+    return HttpResponse(status=204)
@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_network.settings')
 
 application = get_asgi_application()
+
+# needs the app registry, which get_asgi_application sets up
+from network_life.live import live_likes  # noqa: E402
+
+# the live like count stream is answered here, everything else by Django
+application = live_likes(application)
@@ -92,11 +92,14 @@ LOGIN_REDIRECT_URL = '/network-life/login_via_accounts/'
 SOCIALACCOUNT_LOGIN_ON_GET = True
 
 MIDDLEWARE = [
+    'network_life.middleware.RequestMetricsMiddleware',
+    'network_life.routers.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'network_life.profiling.RequestProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -114,6 +117,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'network_life.context_processors.avatar',
             ],
         },
     },
@@ -186,3 +190,112 @@ cloudinary.config(
 )
 
 TAGGIT_CASE_INSENSITIVE = True
+
+# Feed pagination
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+# Likes: with LIKES_BUFFERED clicks are coalesced in memory and written in
+# batches every LIKES_FLUSH_INTERVAL seconds or once LIKES_FLUSH_SIZE intents are pending
+LIKES_BUFFERED = False
+LIKES_FLUSH_SIZE = 500
+LIKES_FLUSH_INTERVAL = 1.0
+# Most like intents accepted by one request to the batch endpoint (api/likes)
+LIKES_BATCH_SIZE = 100
+
+# "Following" timeline: posts are pushed to followers on write unless the author
+# has more than TIMELINE_FANOUT_LIMIT followers, then they are merged in on read
+TIMELINE_FANOUT_LIMIT = 5000
+TIMELINE_BACKFILL = 50
+
+# Seconds the current user's ProfilePage (navbar avatar) is cached for
+PROFILE_CACHE_TIMEOUT = 300
+
+# Tag index shown next to the feed: the TAG_INDEX_SIZE most used tags, cached for TAG_INDEX_TIMEOUT seconds
+TAG_INDEX_SIZE = 30
+TAG_INDEX_TIMEOUT = 600
+
+# Outbox: e-mails are queued and sent by `manage.py send_outbox`, failed sends are
+# retried after OUTBOX_RETRY_DELAY seconds (doubling each time) up to OUTBOX_MAX_ATTEMPTS times. An e-mail
+# claimed by a worker that died while sending it is picked up again after OUTBOX_CLAIM_TIMEOUT seconds
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_RETRY_DELAY = 60
+OUTBOX_CLAIM_TIMEOUT = 300
+
+# Image uploads: storage class used by create_post (network_life.uploads.LocalStorage
+# writes to LOCAL_UPLOAD_ROOT instead of Cloudinary) and the size of the upload thread pool
+IMAGE_STORAGE = 'network_life.uploads.CloudinaryStorage'
+LOCAL_UPLOAD_ROOT = BASE_DIR / 'uploads'
+UPLOAD_MAX_WORKERS = 4
+
+# Locally generated thumbnails (network_life.thumbnails), one file per variant width and format
+THUMBNAIL_ROOT = BASE_DIR / 'thumbnails'
+THUMBNAIL_URL = '/thumbnails/'
+THUMBNAIL_VARIANTS = {
+    'feed': [600, 1200],
+    'grid': [300, 600],
+    'avatar': [32, 64],
+}
+
+# Per request SQL / template / wall time instrumentation (network_life.middleware), off unless
+# REQUEST_METRICS is set. A query shape repeated REQUEST_METRICS_N_PLUS_ONE times is reported as N+1
+REQUEST_METRICS = config('REQUEST_METRICS', default=False, cast=bool)
+REQUEST_METRICS_N_PLUS_ONE = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'network_life.requests': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
+}
+
+# Full-text search (network_life.search): only the SEARCH_CANDIDATES newest matches are ranked
+SEARCH_CANDIDATES = 1000
+
+# Seconds a rendered post card / post page fragment is cached for (network_life.fragments)
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Read replicas (network_life.routers): DB_REPLICAS local SQLite copies of the primary, refreshed
+# by `manage.py sync_replicas`. A browser that wrote reads from the primary for REPLICA_STICKY_SECONDS
+DB_REPLICAS = config('DB_REPLICAS', default=0, cast=int)
+for i in range(DB_REPLICAS):
+    DATABASES[f'replica{i}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db.replica{i}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = [f'replica{i}' for i in range(DB_REPLICAS)]
+DATABASE_ROUTERS = ['network_life.routers.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = 5
+
+# Live like counts (network_life.live): an event stream served by the ASGI application pushes the
+# counts that changed every LIVE_LIKES_INTERVAL seconds for up to LIVE_LIKES_MAX_POSTS posts. With
+# LIVE_LIKES_POLL_DATABASE each process also picks up likes written by the others, one query per interval
+LIVE_LIKES_INTERVAL = 2.0
+LIVE_LIKES_HEARTBEAT = 15.0
+LIVE_LIKES_MAX_POSTS = 200
+LIVE_LIKES_MAX_SECONDS = 300
+LIVE_LIKES_POLL_DATABASE = True
+
+# "Who to follow" (network_life.recommendations), recomputed by `manage.py refresh_recommendations`:
+# RECOMMENDATIONS_PER_USER friend-of-friend accounts are stored per user, RECOMMENDATIONS_SHOWN are shown
+RECOMMENDATIONS_PER_USER = 20
+RECOMMENDATIONS_SHOWN = 5
+
+# Trending feed (network_life.trending): a like is worth half as much after TRENDING_HALF_LIFE seconds.
+# `manage.py decay_trending` decays by the time since its previous run, run it every TRENDING_DECAY_INTERVAL
+# seconds (or with --loop)
+TRENDING_HALF_LIFE = 6 * 3600
+TRENDING_DECAY_INTERVAL = 600
+
+# Per request profiler (network_life.profiling): staff run a request under cProfile with ?profile=1 or an
+# X-Profile: 1 header, off unless REQUEST_PROFILER is set. Reports are kept in PROFILE_ROOT, only the newest
+# PROFILE_MAX_REPORTS up to PROFILE_MAX_BYTES
+REQUEST_PROFILER = config('REQUEST_PROFILER', default=False, cast=bool)
+PROFILE_ROOT = BASE_DIR / 'profiles'
+PROFILE_MAX_REPORTS = 50
+PROFILE_MAX_BYTES = 50 * 1024 * 1024
@@ -1,3 +1,5 @@
+from django.conf import settings
+from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
@@ -6,3 +8,5 @@ urlpatterns = [
     path('network-life/', include('network_life.urls')),
     path('accounts/', include('allauth.urls')),
 ]
+
+urlpatterns += static(settings.THUMBNAIL_URL, document_root=settings.THUMBNAIL_ROOT)